@@ -0,0 +1,148 @@
+"""
+Encodes many payloads at once.
+
+Payloads are grouped by version, and everything after data code generation
+(RS blocks, placement, masking) runs as array operations over the whole group.
+"""
+from collections import defaultdict
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from QR import specs
+from QR.calculations import MaskPattern
+from QR.objects import DataPlacementPath, FormatInfo, FunctionPatternTemplate, create_data_code, \
+    interleave_rs_blocks, select_mask_patterns
+from QR.numpy import QRM
+from QR.value_object import QRModule
+
+
+def encode_batch(payloads: Iterable[Union[str, bytes, memoryview]], error_level: int,
+                 version: Union[int, str] = 'auto', mask_id: Union[int, str] = 'auto',
+                 chunk_size: int = 64) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Creates complete QR codes of all the payloads.
+
+    :param payloads: texts to encode. See create_qr_code()
+    :param error_level: FormatInfo.ERROR_*
+    :param version: 1 ~ 40 for all the payloads, or 'auto' to pick the smallest version for each payload.
+    :param mask_id: 0 ~ 7 for all the payloads, or 'auto' to select the mask with the least penalty for each payload.
+    :param chunk_size: number of symbols whose 8 mask candidates are evaluated at once. Bounds the memory usage.
+    :return: Dict of version -> Tuple of (indices of the payloads, (symbols, n, n) np.ndarray of uint8.)
+        Modules are 1 for ON and 0 for OFF. Symbols are in the same order as the indices.
+    """
+    result = {}
+    for payload_version, (indices, data_codes) in group_data_codes(payloads, error_level, version).items():
+        result[payload_version] = (indices, encode_data_codes(data_codes, payload_version, error_level,
+                                                              mask_id, chunk_size))
+    return result
+
+
+def stream_encode(payloads: Iterable[Union[str, bytes, memoryview]], error_level: int,
+                  version: Union[int, str] = 'auto', mask_id: Union[int, str] = 'auto', chunk_size: int = 1024,
+                  render: Optional[Callable[[np.ndarray], Any]] = None) -> Iterator:
+    """
+    Encodes payloads lazily, chunk by chunk, yielding the symbols in the order of the payloads.
+    Only one chunk is held in memory at a time, and the next chunk is not read from the payloads
+    until the consumer has taken all the symbols of the current one.
+    e.g. stream_encode(line.rstrip('\\n') for line in fp) encodes a file line by line.
+
+    :param payloads: texts to encode. See create_qr_code()
+    :param error_level: FormatInfo.ERROR_*
+    :param version: 1 ~ 40 for all the payloads, or 'auto' to pick the smallest version for each payload.
+    :param mask_id: 0 ~ 7 for all the payloads, or 'auto' to select the mask with the least penalty for each payload.
+    :param chunk_size: number of payloads encoded at once.
+    :param render: function applied to each symbol before it is yielded, e.g. to turn it into image bytes.
+    :return: iterator of (n, n) np.ndarray of uint8 (see encode_batch()), or whatever render returns.
+        Symbols are views of the chunk; copy them to keep them beyond the chunk.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be 1 or more.")
+    payloads = iter(payloads)
+    while True:
+        chunk = list(islice(payloads, chunk_size))
+        if 0 == len(chunk):
+            return
+        ordered = [None] * len(chunk)
+        for indices, symbols in encode_batch(chunk, error_level, version, mask_id).values():
+            for index, symbol in zip(indices, symbols):
+                ordered[index] = symbol
+        del chunk
+        for symbol in ordered:
+            yield symbol if render is None else render(symbol)
+        del ordered
+
+
+def group_data_codes(payloads: Iterable[Union[str, bytes, memoryview]], error_level: int,
+                     version: Union[int, str] = 'auto') -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Creates data codes of all the payloads, grouped by version.
+
+    :param payloads: texts to encode. See create_qr_code()
+    :param error_level: FormatInfo.ERROR_*
+    :param version: 1 ~ 40 for all the payloads, or 'auto' to pick the smallest version for each payload.
+    :return: Dict of version -> Tuple of (indices of the payloads, (symbols, data code capacity) np.ndarray of uint8.)
+        Versions are in ascending order.
+    """
+    groups = defaultdict(list)
+    for index, raw_text in enumerate(payloads):
+        payload_version, data_code = create_data_code(raw_text, error_level, version)
+        groups[payload_version].append((index, data_code))
+
+    result = {}
+    for payload_version in sorted(groups):
+        indices = np.array([index for index, _ in groups[payload_version]], dtype=np.intp)
+        data_codes = np.array([data_code for _, data_code in groups[payload_version]], dtype=np.uint8)
+        result[payload_version] = (indices, data_codes)
+    return result
+
+
+def encode_data_codes(data_codes: np.ndarray, version: int, error_level: int, mask_id: Union[int, str] = 'auto',
+                      chunk_size: int = 64) -> np.ndarray:
+    """
+    Creates complete QR codes of data codes of the same version and error level.
+
+    :param data_codes: (symbols, data code capacity) array. RAW DATA, DO NOT INCLUDE ERROR CORRECTING CODES!
+    :param version: 1 ~ 40
+    :param error_level: FormatInfo.ERROR_*
+    :param mask_id: 0 ~ 7, or 'auto' to select the mask with the least penalty for each symbol.
+    :param chunk_size: See encode_batch()
+    :return: (symbols, n, n) np.ndarray of uint8. Modules are 1 for ON and 0 for OFF.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be 1 or more.")
+    binary_codes = np.unpackbits(interleave_rs_blocks(data_codes,
+                                                      specs.get_rs_block_info(version, error_level),
+                                                      specs.get_error_code_word_count(version, error_level)),
+                                 axis=1)
+
+    base, reserved = FunctionPatternTemplate.get(version)
+    path = DataPlacementPath.get(version)
+    symbol_count = len(data_codes)
+    length = base.shape[0]
+
+    # Data part only. Modules not on the path are left OFF, and so are remainder bits.
+    symbols = np.zeros(shape=(symbol_count, length, length), dtype=QRM)
+    symbols.reshape(symbol_count, -1)[:, path[:binary_codes.shape[1]]] = binary_codes
+
+    if 'auto' == mask_id:
+        mask_ids = np.empty(symbol_count, dtype=np.intp)
+        for start in range(0, symbol_count, chunk_size):
+            chunk = symbols[start:start + chunk_size]
+            mask_ids[start:start + chunk_size] = select_mask_patterns(chunk, version, error_level)
+    else:
+        mask_ids = np.full(symbol_count, mask_id, dtype=np.intp)
+
+    planes = MaskPattern.get_planes(version)
+    format_infos = FormatInfo.get_stack(version, error_level)
+    for start in range(0, symbol_count, chunk_size):
+        chunk = symbols[start:start + chunk_size]
+        chunk_mask_ids = mask_ids[start:start + chunk_size]
+        np.bitwise_xor(chunk, planes[chunk_mask_ids], out=chunk, where=~reserved)
+        # Function patterns and format info replace whatever the data part has there.
+        np.copyto(chunk, base, where=reserved & (QRModule.null_value != base))
+        np.copyto(chunk, format_infos[chunk_mask_ids], where=QRModule.null_value != format_infos[chunk_mask_ids])
+
+    # Every module is 0 or 1 by now, so the buffer can be handed out as unsigned as it is.
+    return symbols.view(np.uint8)
@@ -0,0 +1,213 @@
+"""
+Caches encoded symbols by their content, so that repeated payloads are not encoded again.
+"""
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from QR.batch import encode_batch
+from QR.objects import create_qr_code
+from QR.value_object import QRModule
+
+
+class SymbolCache:
+    """
+    LRU cache of bit-packed symbols, bounded by the total size of the symbols.
+    Optionally backed by an sqlite database, which survives restarts and is not bounded.
+    Symbols are written to the database in batches; call commit() or close() to make the rest durable.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, path: Optional[str] = None, commit_interval: int = 1000):
+        """
+        :param max_bytes: total size of the bit-packed symbols to keep in memory.
+        :param path: sqlite database file of the disk tier. Memory only if None.
+        :param commit_interval: number of symbols put on disk before they are committed together.
+        """
+        self.max_bytes = max_bytes
+        self.commit_interval = commit_interval
+        # Symbols put on disk but not committed yet.
+        self.uncommitted = 0
+        # key -> (version, bit-packed symbol), least recently used first.
+        self.entries: OrderedDict[bytes, Tuple[int, bytes]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        # Hits which were found on disk (and not in memory.) Included in hits.
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute('CREATE TABLE IF NOT EXISTS symbols (key BLOB PRIMARY KEY, version INTEGER, packed BLOB)')
+            self.db.commit()
+
+    @staticmethod
+    def get_key(payload: Union[str, bytes, memoryview], error_level: int, version: Union[int, str] = 'auto',
+                mask_id: Union[int, str] = 'auto') -> bytes:
+        """
+        Gets the key of the symbol to be created with the arguments of create_qr_code().
+
+        :return: 16-byte digest
+        """
+        # str and bytes of the same contents are encoded differently, so they must not share the key.
+        if isinstance(payload, str):
+            digest = hashlib.blake2b(b's', digest_size=16)
+            digest.update(payload.encode('utf-8'))
+        else:
+            digest = hashlib.blake2b(b'b', digest_size=16)
+            digest.update(payload)
+        digest.update('/{}/{}/{}'.format(error_level, version, mask_id).encode('ascii'))
+        return digest.digest()
+
+    @staticmethod
+    def pack(symbol: np.ndarray) -> bytes:
+        """
+        :param symbol: (n, n) array where ON modules are 1.
+        :return: bit-packed rows, like QRMatrix.get_packed()
+        """
+        return np.packbits(QRModule.on_value == symbol, axis=1).tobytes()
+
+    @staticmethod
+    def unpack(version: int, packed: bytes) -> np.ndarray:
+        """
+        :param version:
+        :param packed: See pack()
+        :return: (n, n) np.ndarray of uint8, 1 for ON and 0 for OFF.
+        """
+        length = 17 + version * 4
+        rows = np.frombuffer(packed, dtype=np.uint8).reshape(length, -1)
+        return np.unpackbits(rows, axis=1, count=length)
+
+    def get(self, key: bytes) -> Optional[Tuple[int, bytes]]:
+        """
+        Looks up memory, then disk. Counts a hit or a miss.
+
+        :param key: See get_key()
+        :return: Tuple of (version, bit-packed symbol), or None if not cached.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        elif self.db is not None:
+            row = self.db.execute('SELECT version, packed FROM symbols WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                entry = (row[0], bytes(row[1]))
+                self.disk_hits += 1
+                self.put(key, entry[0], entry[1], persist=False)
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key: bytes, version: int, packed: bytes, persist: bool = True):
+        """
+        Stores the symbol, evicting the least recently used ones from memory if needed.
+
+        :param key: See get_key()
+        :param version:
+        :param packed: See pack()
+        :param persist: also store on disk, if there is the disk tier.
+            Committed every commit_interval symbols, or by commit().
+        """
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1])
+        if len(packed) <= self.max_bytes:
+            self.entries[key] = (version, packed)
+            self.size += len(packed)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted[1])
+        if persist and self.db is not None:
+            self.db.execute('INSERT OR REPLACE INTO symbols VALUES (?, ?, ?)', (key, version, packed))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_interval:
+                self.commit()
+
+    def commit(self):
+        """
+        Writes the symbols put so far into the disk tier.
+        """
+        if self.db is not None:
+            self.db.commit()
+        self.uncommitted = 0
+
+    def encode(self, payload: Union[str, bytes, memoryview], error_level: int, version: Union[int, str] = 'auto',
+               mask_id: Union[int, str] = 'auto') -> np.ndarray:
+        """
+        create_qr_code() through the cache.
+        A miss is written to disk along with the others, not committed right away. See commit_interval.
+
+        :return: (n, n) np.ndarray of uint8, 1 for ON and 0 for OFF.
+        """
+        key = SymbolCache.get_key(payload, error_level, version, mask_id)
+        entry = self.get(key)
+        if entry is not None:
+            return SymbolCache.unpack(*entry)
+
+        qr_matrix = create_qr_code(payload, error_level, version, mask_id)
+        self.put(key, qr_matrix.version, SymbolCache.pack(qr_matrix.value))
+        return qr_matrix.as_uint8().copy()
+
+    def encode_batch(self, payloads: Iterable[Union[str, bytes, memoryview]], error_level: int,
+                     version: Union[int, str] = 'auto', mask_id: Union[int, str] = 'auto',
+                     chunk_size: int = 64) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """
+        encode_batch() through the cache. Only the payloads not in the cache are encoded, all at once.
+
+        :return: See encode_batch()
+        """
+        payloads = list(payloads)
+        keys = [SymbolCache.get_key(payload, error_level, version, mask_id) for payload in payloads]
+
+        groups: Dict[int, Tuple[List[int], List[np.ndarray]]] = {}
+        missed: List[int] = []
+        # Same payloads in the batch are encoded once. Their first occurrences are encoded.
+        first_missed: Dict[bytes, int] = {}
+        for index, key in enumerate(keys):
+            if key in first_missed:
+                self.misses += 1
+                missed.append(index)
+                continue
+            entry = self.get(key)
+            if entry is None:
+                missed.append(index)
+                first_missed[key] = index
+                continue
+            group = groups.setdefault(entry[0], ([], []))
+            group[0].append(index)
+            group[1].append(SymbolCache.unpack(*entry))
+
+        to_encode = list(first_missed.values())
+        encoded: Dict[bytes, Tuple[int, np.ndarray]] = {}
+        for payload_version, (indices, symbols) in encode_batch([payloads[index] for index in to_encode],
+                                                                error_level, version, mask_id, chunk_size).items():
+            for index, symbol in zip(indices, symbols):
+                key = keys[to_encode[index]]
+                self.put(key, payload_version, SymbolCache.pack(symbol))
+                encoded[key] = (payload_version, symbol)
+        self.commit()
+
+        for index in missed:
+            payload_version, symbol = encoded[keys[index]]
+            group = groups.setdefault(payload_version, ([], []))
+            group[0].append(index)
+            group[1].append(symbol)
+
+        result = {}
+        for payload_version in sorted(groups):
+            indices = np.array(groups[payload_version][0], dtype=np.intp)
+            order = np.argsort(indices)
+            result[payload_version] = (indices[order], np.stack(groups[payload_version][1])[order])
+        return result
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
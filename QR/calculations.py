@@ -6,7 +6,7 @@ Hungarian notations is practiced here if galois field calculation is involved.
 e_ means exponential notation (alpha^x), and i_ means plain-old integer notation (n).
 """
 import copy
-from typing import List
+from typing import Dict, List, Optional
 import numpy as np
 
 gf_s = 0x1d
@@ -25,52 +25,45 @@ e_from_i[0] = -1  # integer 0 cannot be mapped anywhere. So, if -1 is encountere
 i_from_e[255] = gf_n % 256
 
 
-def i_galois_division(i_fx_input: List, e_gx: List) -> List:
+# is the multiplication table. i_gf_mul[i_a, i_b] is i_a * i_b in GF(2^8).
+i_gf_mul = i_from_e[(e_from_i[:, np.newaxis] + e_from_i[np.newaxis, :]) % 255].astype(np.uint8)
+i_gf_mul[0, :] = 0
+i_gf_mul[:, 0] = 0
+
+
+def i_rs_encode(i_data: np.ndarray, i_gx: np.ndarray) -> np.ndarray:
     """
-    Performs GF(2^8) division.
+    Calculates the error correcting codes for many RS blocks at once.
+    This is f(x) * x^n mod g(x) done as an LFSR, stepping all the blocks together.
 
-    :param i_fx_input:
-    :param e_gx:
-    :return: 
+    :param i_data: (blocks, data code count) array of data codes. All blocks must have the same length.
+    :param i_gx: generator polynomial of degree n, from the highest order. Leading 1 included.
+    :return: (blocks, n) np.ndarray of uint8, the error correcting codes of each block.
     """
+    i_data = np.atleast_2d(np.asarray(i_data, dtype=np.uint8))
+    i_gx_tail = np.asarray(i_gx, dtype=np.uint8)[1:]
+
+    i_remainder = np.zeros(shape=(i_data.shape[0], len(i_gx_tail)), dtype=np.uint8)
+    for j in range(i_data.shape[1]):
+        i_factor = i_data[:, j] ^ i_remainder[:, 0]
+        i_remainder[:, :-1] = i_remainder[:, 1:]
+        i_remainder[:, -1] = 0
+        i_remainder ^= i_gf_mul[i_factor[:, np.newaxis], i_gx_tail]
+    return i_remainder
 
-    # REQUIRED deepcopy to cut the reference.
-    i_fx = copy.deepcopy(i_fx_input)
-
-    print(' '.join("{0}".format(n) for n in i_fx))
-    i_gx = []
-    for e in e_gx:
-        i_gx.append(i_from_e[e])
-    print(' '.join("{0}".format(n) for n in i_gx))
-
-    while True:
-        e_code = e_from_i[i_fx[0]]
-        # First we add the exponented numbers to all the coefficient of GX.
-        # This effectively does g(x) * <highest dim of f(x)>
-        # We're intentionally padding with -1, which is invalid. We mark these as nonexistent terms.
-        # See iof[0] for reason.
-        e_gx_times_fx = e_gx + [-1] * (len(i_fx) - len(e_gx))
-        for j in range(len(e_gx_times_fx)):
-            if -1 == e_gx_times_fx[j]:
-                continue  # Nonexistent terms should appear in the end.
-            e_gx_times_fx[j] = (e_gx_times_fx[j] + e_code) % 255
-        # whose results will be XOR'd with the starting data code array
-        for j in range(len(e_gx_times_fx)):
-            # encountering negative exponent means that term is supposed not to exist.
-            if -1 != e_gx_times_fx[j]:
-                i_fx[j] = i_from_e[e_gx_times_fx[j]] ^ i_fx[j]
-            else:
-                i_fx[j] = 0
 
-        if i_fx[0] != 0:
-            print("Oops? This may indicate a calculation failure.")
-        if i_fx[-1] != 0:
-            i_fx.pop(0)
-            print("Calculation reached the end, exiting!")
-            break
-        i_fx.pop(0)
+def i_galois_division(i_fx_input: List, e_gx: List) -> List:
+    """
+    Performs GF(2^8) division, and returns the remainder.
 
-    return i_fx
+    :param i_fx_input: f(x), from the highest order.
+    :param e_gx: g(x), from the highest order.
+    :return: remainder, len(e_gx) - 1 terms.
+    """
+    i_fx = np.asarray(i_fx_input, dtype=np.uint8)
+    dim_of_gx = len(e_gx) - 1
+    i_remainder = i_rs_encode(i_fx[np.newaxis, :len(i_fx) - dim_of_gx], i_from_e[e_gx])[0]
+    return (i_remainder ^ i_fx[len(i_fx) - dim_of_gx:]).tolist()
 
 
 def i_pad_codes(input_array: List, max_dim_of_gx: int) -> List:
@@ -79,32 +72,28 @@ def i_pad_codes(input_array: List, max_dim_of_gx: int) -> List:
     return result + [0] * max_dim_of_gx
 
 
-def bch_15_5_division(fx_input: List) -> List:
-    # REQUIRED deepcopy to cut the reference.
-    fx = copy.deepcopy(fx_input)
-
-    fx = i_pad_codes(fx, 10)
-
-    # this is a constant
-    gx = [1, 0, 1, 0, 0, 1, 1, 0, 1, 1, 1]
-
-    # Perform f(x) / g(x)
-    while True:
+def bch_encode(data: int, gx: int) -> int:
+    """
+    Appends the BCH code to the data, that is f(x) * x^(dim of g(x)) + the remainder of it / g(x) in GF(2).
+    Polynomials are expressed as bits of an integer, the highest order being the most significant.
 
-        end_flag = False
-        while 0 == fx[0]:
-            fx.pop(0)
-            if len(fx) < len(gx):
-                end_flag = True
-                break
+    :param data: f(x)
+    :param gx: g(x)
+    :return: the whole code word.
+    """
+    dim_of_gx = gx.bit_length() - 1
+    remainder = data << dim_of_gx
+    while remainder.bit_length() > dim_of_gx:
+        remainder ^= gx << (remainder.bit_length() - 1 - dim_of_gx)
+    return (data << dim_of_gx) | remainder
 
-        if end_flag:
-            break
 
-        for i in range(len(gx)):
-            fx[i] = fx[i] ^ gx[i]
+# BCH(15, 5) code words of the format info, indexed by (error level << 3 | mask pattern ID.)
+# XOR-ed with 0x5412, so that they are never all 0.
+format_words = np.array([bch_encode(data, 0b10100110111) ^ 0x5412 for data in range(32)])
 
-    return fx
+# BCH(18, 6) code words of the version info, indexed by version. Only versions 7 or above have them.
+version_words = np.array([0] * 7 + [bch_encode(version, 0b1111100100101) for version in range(7, 41)])
 
 
 class MaskPattern:
@@ -119,24 +108,191 @@ class MaskPattern:
         7: lambda r, c: 0 == (((r * c) % 3 + ((r + c) % 2)) % 2)
     }
 
+    # version -> read-only (8, n, n) np.ndarray of bool. True where the module should be flipped.
+    planes = {}
+
     @staticmethod
     def calculate(r, c, pattern_id: int) -> bool:
         return MaskPattern.data[pattern_id](r, c)
 
+    @staticmethod
+    def get_planes(version: int) -> np.ndarray:
+        """
+        Gets the mask planes of all the 8 patterns for the version, building them on the first call.
+        Note that the planes cover the whole symbol; function patterns must be excluded by the caller.
+
+        :param version:
+        :return: read-only (8, n, n) np.ndarray of bool, indexed by pattern ID.
+        """
+        if version not in MaskPattern.planes:
+            length = 17 + version * 4
+            r, c = np.indices((length, length))
+            planes = np.stack([MaskPattern.calculate(r, c, pattern_id) for pattern_id in range(8)])
+            planes.flags.writeable = False
+            MaskPattern.planes[version] = planes
+        return MaskPattern.planes[version]
+
+    @staticmethod
+    def get_plane(version: int, pattern_id: int) -> np.ndarray:
+        """
+        Gets the mask plane of a pattern for the version.
+
+        :param version:
+        :param pattern_id: 0 ~ 7
+        :return: read-only (n, n) np.ndarray of bool
+        """
+        return MaskPattern.get_planes(version)[pattern_id]
+
+
+class MaskPenalty:
+    """
+    Penalty rules to evaluate masked symbols with. Lower is better.
+    """
+
+    N1 = 3  # Each run of 5 same-colour modules in a row / column, plus 1 per extra module
+    N2 = 3  # Each 2x2 block of same-colour modules
+    N3 = 40  # Each 1:1:3:1:1 (dark:light:dark:light:dark) pattern with 4 light modules on either side
+    N4 = 10  # Each 5% deviation of the dark module ratio from 50%
+
+    finder_like = np.array([True, False, True, True, True, False, True])
+
+    @staticmethod
+    def calculate(symbols: np.ndarray) -> np.ndarray:
+        """
+        Scores stacked symbols all at once.
+
+        :param symbols: np.ndarray of shape (..., n, n) where dark modules are 1. No null modules allowed.
+        :return: np.ndarray of shape (...) with the total penalty points of each symbol.
+        """
+        dark = 1 == symbols
+        length = dark.shape[-1]
+        penalty = np.zeros(shape=dark.shape[:-2], dtype=int)
+
+        # Rules 1 and 3 are checked for both rows and columns.
+        for lines in (dark, np.swapaxes(dark, -1, -2)):
+            # Rule 1: runs. A run of k modules contains (k - 4) windows of 5, and it starts only once.
+            same = lines[..., 1:] == lines[..., :-1]
+            five = MaskPenalty.all_in_window(same, 4)
+            starts = five.copy()
+            starts[..., 1:] &= ~same[..., :-4]
+            penalty += five.sum(axis=(-1, -2)) + (MaskPenalty.N1 - 1) * starts.sum(axis=(-1, -2))
+
+            # Rule 3: finder-like patterns. Outside of the symbol (quiet zone) is light.
+            padded = np.pad(lines, [(0, 0)] * (lines.ndim - 1) + [(4, 4)])
+            core = MaskPenalty.all_in_window(padded, 7, MaskPenalty.finder_like)
+            light = MaskPenalty.all_in_window(~padded, 4)
+            core = core[..., 4:length - 2]
+            light_before = light[..., 0:length - 6]
+            light_after = light[..., 11:length + 5]
+            penalty += MaskPenalty.N3 * (core & (light_before | light_after)).sum(axis=(-1, -2))
+
+        # Rule 2: 2x2 blocks.
+        upper_left = dark[..., :-1, :-1]
+        blocks = (upper_left == dark[..., 1:, :-1]) & (upper_left == dark[..., :-1, 1:]) & \
+                 (upper_left == dark[..., 1:, 1:])
+        penalty += MaskPenalty.N2 * blocks.sum(axis=(-1, -2))
+
+        # Rule 4: dark ratio.
+        dark_count = dark.sum(axis=(-1, -2))
+        total = length * length
+        penalty += MaskPenalty.N4 * (np.abs(dark_count * 2 - total) * 10 // total)
+
+        return penalty
+
+    @staticmethod
+    def all_in_window(lines: np.ndarray, width: int, pattern: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Checks every window along the last axis. Shifted slices are ANDed together,
+        which is much faster than reducing a sliding window view when the window is short.
+
+        :param lines: np.ndarray of bool
+        :param width: window width
+        :param pattern: bool array of the window width to match. All True if None.
+        :return: np.ndarray of bool, whose last axis is shorter by (width - 1), True where the window starts.
+        """
+        count = lines.shape[-1] - width + 1
+        result = np.ones(shape=lines.shape[:-1] + (count,), dtype=bool)
+        for offset in range(width):
+            window = lines[..., offset:offset + count]
+            if pattern is not None and not pattern[offset]:
+                result &= ~window
+            else:
+                result &= window
+        return result
+
+
+class ReedSolomonCache:
+    """
+    Keeps Reed-Solomon tables and generator polynomials for the life of the process.
+    """
+
+    # ECC word count -> i_ generator polynomial
+    generators: Dict[int, np.ndarray] = {}
+
+    @staticmethod
+    def get_generator(ecc_word_count: int) -> np.ndarray:
+        """
+        Gets the generator polynomial for the ECC word count, building it on the first call.
+
+        :param ecc_word_count:
+        :return: np.ndarray of uint8, coefficients (integer notation) from the highest order.
+        """
+        if ecc_word_count not in ReedSolomonCache.generators:
+            i_gx = i_from_e[GaloisDividerDictionary.get_divider_for(ecc_word_count)].astype(np.uint8)
+            i_gx.flags.writeable = False
+            ReedSolomonCache.generators[ecc_word_count] = i_gx
+        return ReedSolomonCache.generators[ecc_word_count]
+
+    @staticmethod
+    def encode(data_code: List, ecc_word_count: int) -> List:
+        """
+        Calculates the error correcting codes for the RS block.
+
+        :param data_code: data code of one RS block.
+        :param ecc_word_count:
+        :return: data code followed by the error correcting codes.
+        """
+        return list(data_code) + ReedSolomonCache.encode_blocks([data_code], ecc_word_count)[0].tolist()
+
+    @staticmethod
+    def encode_blocks(data_codes: np.ndarray, ecc_word_count: int) -> np.ndarray:
+        """
+        Calculates the error correcting codes for many RS blocks of the same length at once.
+
+        :param data_codes: (blocks, data code count) array of data codes.
+        :param ecc_word_count:
+        :return: (blocks, ecc_word_count) np.ndarray of uint8
+        """
+        return i_rs_encode(data_codes, ReedSolomonCache.get_generator(ecc_word_count))
+
+
+def e_generator_polynomials(max_dim: int) -> np.ndarray:
+    """
+    Derives the generator polynomials g(x) = (x - a^0)(x - a^1)...(x - a^(n-1)) for n = 0 ~ max_dim.
+
+    :param max_dim: the highest degree needed.
+    :return: (max_dim + 1, max_dim + 1) np.ndarray. Row n holds the n + 1 coefficients (exponent notation)
+        of the degree n polynomial from the highest order, padded with -1.
+    """
+    e_result = np.full(shape=(max_dim + 1, max_dim + 1), fill_value=-1, dtype=np.int16)
+    i_gx = np.ones(shape=1, dtype=np.uint8)
+    e_result[0, 0] = 0
+    for n in range(1, max_dim + 1):
+        # g(x) * (x - a^(n-1)); subtraction is XOR in GF(2^8).
+        i_next = np.append(i_gx, 0)
+        i_next[1:] ^= i_gf_mul[i_gx, i_from_e[n - 1]]
+        i_gx = i_next
+        e_result[n, :n + 1] = e_from_i[i_gx]
+    return e_result
+
 
 class GaloisDividerDictionary:
-    data = {
-        7: [0, 87, 229, 146, 149, 238, 102, 21],
-        10: [0, 251, 67, 46, 61, 118, 70, 64, 94, 32, 45],
-        13: [0, 74, 152, 176, 100, 86, 100, 106, 104, 130, 218, 206, 140, 78],
-        16: [0, 120, 104, 107, 109, 102, 161, 76, 3, 91, 191, 147, 169, 182, 194, 225, 120],
-        17: [0, 43, 139, 206, 78, 43, 239, 123, 206, 214, 147, 24, 99, 150, 39, 243, 163, 136],
-        18: [0, 215, 234, 158, 94, 184, 97, 118, 170, 79, 187, 152, 148, 252, 179, 5, 98, 96, 153],
-        22: [0, 210, 171, 247, 242, 93, 230, 14, 109, 221, 53, 200, 74, 8, 172, 98, 80, 219, 134, 160, 105, 165, 231],
-        28: [0, 168, 223, 200, 104, 224, 234, 108, 180, 110, 190, 195, 147, 205, 27, 232, 201, 21, 43, 245, 87, 42, 195,
-             212, 119, 242, 37, 9, 123],
-    }
+    # QR codes use up to 30 error correcting code words per RS block.
+    max_error_word_count = 30
+    data = e_generator_polynomials(max_error_word_count)
 
     @staticmethod
     def get_divider_for(error_word_count: int) -> List:
-        return GaloisDividerDictionary.data[error_word_count]
+        if not (1 <= error_word_count <= GaloisDividerDictionary.max_error_word_count):
+            raise KeyError(error_word_count)
+        return GaloisDividerDictionary.data[error_word_count, :error_word_count + 1].tolist()
@@ -0,0 +1,354 @@
+"""
+Data encoding modes.
+Each mode converts the whole text at once through a 256-entry lookup table.
+"""
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from binary_operations.bit_writer import BitWriter
+
+
+class Mode:
+    """
+    Mode indicators, written in the first 4 bits of each segment.
+    """
+
+    NUMERIC = 0x1
+    ALPHANUMERIC = 0x2
+    BYTE = 0x4
+    KANJI = 0x8
+
+    # Width of the length field for version 1 ~ 9, 10 ~ 26 and 27 ~ 40 (specs.version_classes.)
+    length_bits = {
+        NUMERIC: (10, 12, 14),
+        ALPHANUMERIC: (9, 11, 13),
+        BYTE: (8, 16, 16),
+        KANJI: (8, 10, 12),
+    }
+
+    @staticmethod
+    def get_length_bits(mode: int, version: int) -> int:
+        """
+        Gets the width of the length field.
+
+        :param mode: Mode.*
+        :param version: 1 ~ 40
+        :return: number of bits
+        """
+        if version <= 9:
+            return Mode.length_bits[mode][0]
+        elif version <= 26:
+            return Mode.length_bits[mode][1]
+        else:
+            return Mode.length_bits[mode][2]
+
+
+alphanumeric_chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+
+# byte -> value in alphanumeric mode. -1 if the byte cannot be encoded.
+alphanumeric_table = np.full(shape=256, fill_value=-1, dtype=np.int16)
+alphanumeric_table[np.frombuffer(alphanumeric_chars.encode('ascii'), dtype=np.uint8)] = np.arange(45)
+
+# byte -> value in numeric mode. -1 if the byte is not a digit.
+numeric_table = np.full(shape=256, fill_value=-1, dtype=np.int16)
+numeric_table[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+
+
+def lookup(table: np.ndarray, data: bytes, mode_name: str) -> np.ndarray:
+    """
+    Converts the bytes through the table, checking that every byte can be encoded.
+
+    :param table: 256-entry lookup table
+    :param data: bytes to convert
+    :param mode_name: used in the error message
+    :return: np.ndarray of int
+    """
+    values = table[np.frombuffer(data, dtype=np.uint8)].astype(np.int64)
+    invalid = np.flatnonzero(values < 0)
+    if 0 != len(invalid):
+        raise ValueError("{!r} at index {} cannot be encoded in {} mode.".format(
+            data[invalid[0]:invalid[0] + 1], int(invalid[0]), mode_name))
+    return values
+
+
+def write_numeric(writer: BitWriter, data: bytes):
+    """
+    Writes digits in numeric mode: 10 bits per 3 digits, then 7 bits for 2 or 4 bits for 1 leftover digit(s.)
+    Mode indicator and length are NOT written.
+
+    :param writer:
+    :param data: ASCII digits
+    """
+    values = lookup(numeric_table, data, "numeric")
+    full_count = len(values) // 3
+    writer.write_array(values[:full_count * 3].reshape(full_count, 3) @ [100, 10, 1], 10)
+    rest = values[full_count * 3:]
+    if 0 != len(rest):
+        writer.write(int(rest @ [10, 1][2 - len(rest):]), 1 + 3 * len(rest))
+
+
+def write_alphanumeric(writer: BitWriter, data: bytes):
+    """
+    Writes text in alphanumeric mode: 11 bits per 2 chars, then 6 bits for the leftover char.
+    Mode indicator and length are NOT written.
+
+    :param writer:
+    :param data: ASCII text consisting of alphanumeric_chars
+    """
+    values = lookup(alphanumeric_table, data, "alphanumeric")
+    pair_count = len(values) // 2
+    writer.write_array(values[:pair_count * 2].reshape(pair_count, 2) @ [45, 1], 11)
+    if 1 == len(values) % 2:
+        writer.write(int(values[-1]), 6)
+
+
+class ShiftJISTable:
+    """
+    Code point -> Shift-JIS code lookup table, of the chars which can be encoded in kanji mode.
+    Built on the first use, so that encoding never calls the codec per char.
+    """
+
+    # np.ndarray of uint16 indexed by code point (BMP only.) 0 if the char cannot be encoded in kanji mode.
+    table: Optional[np.ndarray] = None
+
+    @staticmethod
+    def get() -> np.ndarray:
+        """
+        Gets the lookup table, building it on the first call.
+
+        :return: read-only np.ndarray of uint16, 0x10000 entries.
+        """
+        if ShiftJISTable.table is None:
+            ShiftJISTable.table = ShiftJISTable.build()
+        return ShiftJISTable.table
+
+    @staticmethod
+    def build() -> np.ndarray:
+        """
+        Builds the lookup table by decoding every double-byte code kanji mode can hold.
+
+        :return: See get()
+        """
+        table = np.zeros(shape=0x10000, dtype=np.uint16)
+        for high in list(range(0x81, 0xa0)) + list(range(0xe0, 0xec)):
+            for low in range(0x40, 0xfd):
+                if 0x7f == low:
+                    continue
+                try:
+                    char = bytes([high, low]).decode('shift_jis')
+                except UnicodeDecodeError:
+                    continue
+                if 1 == len(char) and ord(char) < 0x10000:
+                    table[ord(char)] = high << 8 | low
+        table.flags.writeable = False
+        return table
+
+    @staticmethod
+    def encodable(code_points: np.ndarray) -> np.ndarray:
+        """
+        Checks which chars can be encoded in kanji mode.
+
+        :param code_points: np.ndarray of code points
+        :return: np.ndarray of bool
+        """
+        return (code_points < 0x10000) & (0 != ShiftJISTable.get()[np.minimum(code_points, 0xffff)])
+
+    @staticmethod
+    def encode(text: str) -> bytes:
+        """
+        Converts the text into Shift-JIS double-byte codes.
+
+        :param text: chars which can be encoded in kanji mode
+        :return: bytes, 2 bytes per char.
+        """
+        code_points = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+        invalid = np.flatnonzero(~ShiftJISTable.encodable(code_points))
+        if 0 != len(invalid):
+            raise ValueError("{!r} at index {} cannot be encoded in kanji mode.".format(
+                text[invalid[0]], int(invalid[0])))
+        return ShiftJISTable.get()[code_points].astype('>u2').tobytes()
+
+
+def write_kanji(writer: BitWriter, data: bytes):
+    """
+    Writes Shift-JIS double-byte codes in kanji mode: 13 bits per char.
+    Mode indicator and length are NOT written.
+
+    :param writer:
+    :param data: Shift-JIS codes in 0x8140 ~ 0x9ffc or 0xe040 ~ 0xebbf, 2 bytes each.
+    """
+    codes = np.frombuffer(data, dtype='>u2').astype(np.int64)
+    invalid = np.flatnonzero(~(((0x8140 <= codes) & (codes <= 0x9ffc)) | ((0xe040 <= codes) & (codes <= 0xebbf))))
+    if 0 != len(invalid):
+        raise ValueError("0x{:04x} at index {} cannot be encoded in kanji mode.".format(
+            int(codes[invalid[0]]), int(invalid[0])))
+    codes -= np.where(codes >= 0xe040, 0xc140, 0x8140)
+    writer.write_array((codes >> 8) * 0xc0 + (codes & 0xff), 13)
+
+
+def write_bytes(writer: BitWriter, data: bytes):
+    """
+    Writes bytes in byte mode: 8 bits per byte.
+    Mode indicator and length are NOT written.
+
+    :param writer:
+    :param data: any bytes
+    """
+    writer.write_bytes(data)
+
+
+# Mode -> function writing the data of a segment.
+writers = {
+    Mode.NUMERIC: write_numeric,
+    Mode.ALPHANUMERIC: write_alphanumeric,
+    Mode.BYTE: write_bytes,
+    Mode.KANJI: write_kanji,
+}
+
+
+def get_char_count(mode: int, data: bytes) -> int:
+    """
+    Gets the value of the length field of a segment.
+
+    :param mode: Mode.*
+    :param data: encoded data of the segment
+    :return: number of chars (bytes in byte mode)
+    """
+    return len(data) // 2 if Mode.KANJI == mode else len(data)
+
+
+def get_segment_bit_length(mode: int, data: bytes, version: int) -> int:
+    """
+    Gets the length of a segment, including mode indicator and length field.
+
+    :param mode: Mode.*
+    :param data: encoded data of the segment
+    :param version: 1 ~ 40
+    :return: number of bits
+    """
+    count = len(data)
+    if Mode.NUMERIC == mode:
+        data_bits = 10 * (count // 3) + (0, 4, 7)[count % 3]
+    elif Mode.ALPHANUMERIC == mode:
+        data_bits = 11 * (count // 2) + 6 * (count % 2)
+    elif Mode.KANJI == mode:
+        data_bits = 13 * (count // 2)
+    else:
+        data_bits = 8 * count
+    return 4 + Mode.get_length_bits(mode, version) + data_bits
+
+
+def get_segments_bit_length(segments: List[Tuple[int, bytes]], version: int) -> int:
+    """
+    Gets the length of the segments altogether. Terminator and padding NOT included.
+
+    :param segments: List of Tuple of (Mode.*, encoded data.)
+    :param version: 1 ~ 40
+    :return: number of bits
+    """
+    return sum(get_segment_bit_length(mode, data, version) for mode, data in segments)
+
+
+def write_segments(writer: BitWriter, segments: List[Tuple[int, bytes]], version: int):
+    """
+    Writes segments, each with its mode indicator and length field.
+
+    :param writer:
+    :param segments: List of Tuple of (Mode.*, encoded data.)
+    :param version: 1 ~ 40
+    """
+    for mode, data in segments:
+        length_bits = Mode.get_length_bits(mode, version)
+        char_count = get_char_count(mode, data)
+        if char_count >= 1 << length_bits:
+            raise ValueError("Segment too long! {} chars cannot be written in {} bits.".format(char_count, length_bits))
+        writer.write(mode, 4)
+        writer.write(char_count, length_bits)
+        writers[mode](writer, data)
+
+
+def split_segments(text: Union[str, bytes], version: int) -> List[Tuple[int, bytes]]:
+    """
+    Splits the text into the segments which make the shortest bit stream.
+    This is a dynamic programming over the chars: for each char and each mode, we keep the cheapest cost
+    of encoding the text so far ending in that mode, and where we switched from.
+    Costs are in 1/6 bits so that numeric (10/3 bits per char) and alphanumeric (11/2 bits per char) stay integers.
+
+    :param text: str, whose byte mode segments are encoded in UTF-8 and kanji mode segments in Shift-JIS.
+        bytes are used as they are, and never go in kanji mode.
+    :param version: decides the header costs.
+    :return: List of Tuple of (Mode.*, encoded data.) Adjacent segments have different modes.
+    """
+    if isinstance(text, str):
+        byte_encoding = 'utf-8'
+    else:
+        text = bytes(text).decode('latin-1')
+        byte_encoding = 'latin-1'
+    if 0 == len(text):
+        return []
+
+    modes = [Mode.NUMERIC, Mode.ALPHANUMERIC, Mode.BYTE, Mode.KANJI]
+
+    # Code points, and the cost of each char in each mode. -1 if the char cannot be encoded in the mode.
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+    in_table = np.minimum(code_points, 255)
+    if 'utf-8' == byte_encoding:
+        byte_counts = 1 + (code_points >= 0x80) + (code_points >= 0x800) + (code_points >= 0x10000)
+    else:
+        byte_counts = np.ones(shape=len(code_points), dtype=int)
+    char_costs = [
+        np.where((code_points < 256) & (numeric_table[in_table] >= 0), 20, -1).tolist(),
+        np.where((code_points < 256) & (alphanumeric_table[in_table] >= 0), 33, -1).tolist(),
+        (byte_counts * 48).tolist(),
+        # Raw bytes are never treated as Shift-JIS.
+        np.where(('utf-8' == byte_encoding) & ShiftJISTable.encodable(code_points), 78, -1).tolist(),
+    ]
+    header_costs = [(4 + Mode.get_length_bits(mode, version)) * 6 for mode in modes]
+    mode_indices = range(len(modes))
+
+    # char_modes[i][j]: mode index char i is encoded in, when we are in mode j right after char i.
+    char_modes = []
+    # Cost of the text so far, ending in each mode. The header of the current segment is already paid.
+    costs = header_costs
+    for i in range(len(text)):
+        current_costs = [float('inf')] * len(modes)
+        current_modes = [None] * len(modes)
+        # Append the char to the current segment.
+        for j in mode_indices:
+            if char_costs[j][i] >= 0:
+                current_costs[j] = costs[j] + char_costs[j][i]
+                current_modes[j] = j
+        # Or, close the segment (at a whole bit) after the char and start another one in a different mode.
+        appended_costs = list(current_costs)
+        appended_modes = list(current_modes)
+        for j in mode_indices:
+            for k in mode_indices:
+                if appended_modes[k] is None:
+                    continue
+                switched_cost = (appended_costs[k] + 5) // 6 * 6 + header_costs[j]
+                if switched_cost < current_costs[j]:
+                    current_costs[j] = switched_cost
+                    current_modes[j] = k
+        char_modes.append(current_modes)
+        costs = current_costs
+
+    # Backtrack from the cheapest final mode.
+    mode_index = min(mode_indices, key=lambda index: costs[index])
+    char_mode_indices = [0] * len(text)
+    for i in reversed(range(len(text))):
+        mode_index = char_modes[i][mode_index]
+        char_mode_indices[i] = mode_index
+
+    segments = []
+    start = 0
+    for i in range(1, len(text) + 1):
+        if len(text) == i or char_mode_indices[i] != char_mode_indices[start]:
+            mode = modes[char_mode_indices[start]]
+            chunk = text[start:i]
+            if Mode.KANJI == mode:
+                segments.append((mode, ShiftJISTable.encode(chunk)))
+            else:
+                segments.append((mode, chunk.encode(byte_encoding if Mode.BYTE == mode else 'ascii')))
+            start = i
+    return segments
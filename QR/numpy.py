@@ -2,5 +2,44 @@ import numpy as np
 
 from QR.value_object import QRModule
 
-# Defining QRModule as QRM here so that we can make it compatible with numpy ndarray.
-QRM = np.dtype(QRModule)
\ No newline at end of file
+# Modules are stored as their raw values (-1: null, 0: off, 1: on) in a contiguous int8 buffer,
+# instead of an object array of QRModule pointers. QRModule is only used as a view at the API edge.
+QRM = np.dtype(np.int8)
+
+# Lookup table from module value to its char expression. Index with (value + 1).
+QRM_CHARS = np.array(['N', 'W', 'B'])
+
+
+def module_array(shape, fill_value: int = QRModule.null_value) -> np.ndarray:
+    """
+    Creates a module buffer filled with the given module value.
+
+    :param shape: shape of the buffer
+    :param fill_value: -1, 0, or 1. Default null.
+    :return: np.ndarray of QRM
+    """
+    return np.full(shape=shape, fill_value=fill_value, dtype=QRM)
+
+
+def as_chars(value: np.ndarray) -> np.ndarray:
+    """
+    Converts module buffer into 'B', 'W' or 'N' chars at once.
+
+    :param value: np.ndarray of QRM
+    :return: np.ndarray of str, same shape as value
+    """
+    return QRM_CHARS[value.astype(np.intp) + 1]
+
+
+def as_modules(value: np.ndarray) -> np.ndarray:
+    """
+    Converts module buffer into an object array of QRModule.
+    This is slow; only use this at the API edge.
+
+    :param value: np.ndarray of QRM
+    :return: np.ndarray of QRModule, same shape as value
+    """
+    result = np.empty(shape=value.shape, dtype=object)
+    for index, v in np.ndenumerate(value):
+        result[index] = QRModule(int(v))
+    return result
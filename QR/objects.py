@@ -3,17 +3,17 @@ QR 'Objects' (set of modules)
 """
 from __future__ import annotations  # Needed to mention class itself in class / member function definition
 
-import copy
-from typing import List
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
-import reedsolo as rs
-from reedsolo import RSCodec
 
-from QR.calculations import bch_15_5_division, i_galois_division, i_pad_codes, GaloisDividerDictionary, MaskPattern
-from QR.numpy import QRM
+from QR import specs
+from QR.calculations import format_words, version_words, MaskPattern, MaskPenalty, ReedSolomonCache
+from QR.modes import Mode, ShiftJISTable, get_segments_bit_length, split_segments, write_alphanumeric, write_kanji, \
+    write_numeric, write_segments
+from QR.numpy import module_array, as_chars, as_modules
 from QR.value_object import QRModule
-from binary_operations.conversion import convert_int_to_bool_array
+from binary_operations.bit_writer import BitWriter
 
 
 class QRMatrix:
@@ -26,16 +26,77 @@ class QRMatrix:
         Creates an empty QR matrix.
         Version 1 ~ 40 are possible, and an increase in version means 4 more modules
         along the sides, starting from 21 modules at version 1.
-        But for simplicity, we only allow up to version 6 (mini position marker is the pain in the a**)
-        :param version:  1 ~ 6
-        :return: 2-D np.ndarray of QRModule at specified size.
+        :param version:  1 ~ 40
+        :return: 2-D np.ndarray of QRM (-1: null, 0: off, 1: on) at specified size.
         """
-        if not (1 <= version <= 6):
-            raise ValueError("Version out of range. It should be between 1 and 40.")
+        specs.check_version(version)
 
         self.version = version
         self.length = 17 + version * 4
-        self.value = np.full(shape=(self.length, self.length), fill_value=QRModule.null(), dtype=QRM)
+        self.value = module_array(shape=(self.length, self.length))
+        # Mask pattern ID applied to this matrix. Only set by place_data().
+        self.mask_id: Optional[int] = None
+
+    def get_module(self, row: int, column: int) -> QRModule:
+        """
+        Gets the module at the specified position as QRModule.
+        :param row:
+        :param column:
+        :return: QRModule, a copy. Mutating it does NOT affect this QRMatrix.
+        """
+        return QRModule(int(self.value[row, column]))
+
+    def get_modules(self) -> np.ndarray:
+        """
+        Gets the whole matrix as 2-D np.ndarray of QRModule. Slow, only meant for the API edge.
+        :return: 2-D np.ndarray of QRModule (copies.)
+        """
+        return as_modules(self.value)
+
+    def get_as_char(self) -> np.ndarray:
+        """
+        Gets the whole matrix as 2-D np.ndarray of 'B', 'W' or 'N'.
+        :return: 2-D np.ndarray of str.
+        """
+        return as_chars(self.value)
+
+    def as_uint8(self) -> np.ndarray:
+        """
+        Gets the whole matrix as a read-only uint8 view of the buffer. Nothing is copied.
+        Modules are 1 for ON and 0 for OFF. Null modules read as 255, so this is meant for finished symbols.
+        :return: 2-D np.ndarray of uint8, sharing the memory with this QRMatrix.
+        """
+        view = self.value.view(np.uint8)
+        view.flags.writeable = False
+        return view
+
+    def get_packed(self) -> np.ndarray:
+        """
+        Gets the whole matrix packed into bits, 1 for ON. Each row is padded to whole bytes.
+        :return: 2-D np.ndarray of uint8 (a copy) of shape (n, ceil(n / 8)).
+        """
+        return np.packbits(QRModule.on_value == self.value, axis=1)
+
+    def to_memoryview(self, packed: bool = False) -> memoryview:
+        """
+        Exports the matrix through the buffer protocol.
+        :param packed: False for as_uint8() (no copy), True for get_packed().
+        :return: read-only memoryview of 2-D uint8 (if not packed.)
+        """
+        return memoryview(self.get_packed() if packed else self.as_uint8())
+
+    @property
+    def __array_interface__(self) -> dict:
+        """
+        Lets np.asarray() and alike take as_uint8() without copying. The array keeps this QRMatrix alive.
+        """
+        return self.as_uint8().__array_interface__
+
+    def __buffer__(self, flags: int) -> memoryview:
+        """
+        Buffer protocol for memoryview(), bytes() and alike (Python 3.12+.) Same as to_memoryview().
+        """
+        return self.to_memoryview()
 
     def merge(self, other: QRMatrix, allow_empties: bool = True):
         """
@@ -46,15 +107,20 @@ class QRMatrix:
         """
         if self.length != other.length:
             raise ValueError("Matrix size mismatch! This: {}, Other: {}".format(self.length, other.length))
-        for r in range(self.length):
-            for c in range(self.length):
-                if self.value[r, c].is_null():
-                    if (not allow_empties) and other.value[r, c].is_null():
-                        raise ValueError("Both buffers are null at {}, {} when you didn't allow it.".format(r, c))
-                    self.value[r, c] = other.value[r, c]
-                else:
-                    if not other.value[r, c].is_null():
-                        raise ValueError("Module collision.")
+        this_null = QRModule.null_value == self.value
+        other_null = QRModule.null_value == other.value
+
+        collision = ~this_null & ~other_null
+        if collision.any():
+            raise ValueError("Module collision at (row, column): {}".format(
+                list(map(tuple, np.argwhere(collision).tolist()))))
+        if not allow_empties:
+            holes = this_null & other_null
+            if holes.any():
+                raise ValueError("Both buffers are null at (row, column): {} when you didn't allow it.".format(
+                    list(map(tuple, np.argwhere(holes).tolist()))))
+
+        self.value[this_null] = other.value[this_null]
 
     def overwrite_with(self, other: QRMatrix):
         """
@@ -65,10 +131,9 @@ class QRMatrix:
         if self.length != other.length:
             raise ValueError("Matrix size mismatch! This: {}, Other: {}".format(self.length, other.length))
 
-        for r in range(self.length):
-            for c in range(self.length):
-                # Unless the other module is null, overwrite with other.
-                self.value[r, c] = self.value[r, c] if other.value[r, c].is_null() else other.value[r, c]
+        # Unless the other module is null, overwrite with other.
+        other_assigned = QRModule.null_value != other.value
+        self.value[other_assigned] = other.value[other_assigned]
 
     def place(self, object: np.ndarray, row: int, column: int):
         """
@@ -102,10 +167,10 @@ class PositionMarker:
 
     @staticmethod
     def get_marker_body() -> np.ndarray:
-        position_marker = np.full(shape=(7, 7), fill_value=QRModule.null(), dtype=QRM)
-        marker_back = np.full(shape=(7, 7), fill_value=QRModule.on(), dtype=QRM)
-        marker_middle = np.full(shape=(5, 5), fill_value=QRModule.off(), dtype=QRM)
-        marker_fore = np.full(shape=(3, 3), fill_value=QRModule.on(), dtype=QRM)
+        position_marker = module_array(shape=(7, 7))
+        marker_back = module_array(shape=(7, 7), fill_value=QRModule.on_value)
+        marker_middle = module_array(shape=(5, 5), fill_value=QRModule.off_value)
+        marker_fore = module_array(shape=(3, 3), fill_value=QRModule.on_value)
 
         position_marker[0:7, 0:7] = marker_back
         position_marker[1:6, 1:6] = marker_middle
@@ -115,7 +180,7 @@ class PositionMarker:
 
     @staticmethod
     def create_marker_at(position: int) -> np.ndarray:
-        result = np.full(shape=(8, 8), fill_value=QRModule.off(), dtype=QRM)
+        result = module_array(shape=(8, 8), fill_value=QRModule.off_value)
         if PositionMarker.UPPER_LEFT == position:
             result[0:7, 0:7] = PositionMarker.get_marker_body()
         elif PositionMarker.UPPER_RIGHT == position:
@@ -130,16 +195,33 @@ class PositionMarker:
 
 class MiniPositionMarker:
     """
-    Mini-sized position marker that needs to be present in QR codes version > 1.
-    For 2 <= version <= 6, it's placed at [-9:-4, -9:-4].
+    Mini-sized position marker (alignment pattern) that needs to be present in QR codes version > 1.
+    For 2 <= version <= 6, it's placed at [-9:-4, -9:-4]. Larger versions have more of them.
     """
 
+    @staticmethod
+    def get_centers(version: int) -> List[Tuple[int, int]]:
+        """
+        Gets where the mini position markers are centered.
+
+        :param version:
+        :return: List of Tuple of (row, column.) Empty for version 1.
+        """
+        positions = specs.alignment_pattern_positions[version]
+        if 0 == len(positions):
+            return []
+        first = positions[0]
+        last = positions[-1]
+        # Those overlapping with the position markers are left out.
+        finders = [(first, first), (first, last), (last, first)]
+        return [(r, c) for r in positions for c in positions if (r, c) not in finders]
+
     @staticmethod
     def create() -> np.ndarray:
-        mini_position_marker = np.full(shape=(5, 5), fill_value=QRModule.null(), dtype=QRM)
-        outer = np.full(shape=(5, 5), fill_value=QRModule.on(), dtype=QRM)
-        inner = np.full(shape=(3, 3), fill_value=QRModule.off(), dtype=QRM)
-        center = np.full(shape=(1, 1), fill_value=QRModule.on(), dtype=QRM)
+        mini_position_marker = module_array(shape=(5, 5))
+        outer = module_array(shape=(5, 5), fill_value=QRModule.on_value)
+        inner = module_array(shape=(3, 3), fill_value=QRModule.off_value)
+        center = module_array(shape=(1, 1), fill_value=QRModule.on_value)
         mini_position_marker[0:5, 0:5] = outer
         mini_position_marker[1:4, 1:4] = inner
         mini_position_marker[2:3, 2:3] = center
@@ -155,13 +237,11 @@ class TimingPattern(QRMatrix):
         super().__init__(version)
         # This code writes timing pattern where it's not supposed to,
         # but we'll overwrite afterwards
-        for r in range(self.length):
-            self.value[r, 6] = QRModule.from_condition(0 == r % 2)
-        for c in range(self.length):
-            self.value[6, c] = QRModule.from_condition(0 == c % 2)
+        self.value[:, 6] = (0 == np.arange(self.length) % 2)
+        self.value[6, :] = (0 == np.arange(self.length) % 2)
 
         # and also THIS RANDOM STRAY BLACK MODULE HERE.
-        self.value[-8, 8] = QRModule.on()
+        self.value[-8, 8] = QRModule.on_value
 
 
 class FormatInfo(QRMatrix):
@@ -174,6 +254,11 @@ class FormatInfo(QRMatrix):
     ERROR_QUALITY = 3
     ERROR_HIGH = 2
 
+    # version -> (rows, columns, bit shifts) of the format info modules.
+    coordinates: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    # (version, error level) -> format info of all the 8 mask patterns.
+    stacks: Dict[Tuple[int, int], np.ndarray] = {}
+
     def __init__(self, version: int, error_level: int, mask_pattern: int):
         """
         Creates Format-info-filled QRMatrix.
@@ -184,34 +269,60 @@ class FormatInfo(QRMatrix):
         """
         super(FormatInfo, self).__init__(version)
 
-        type_info = convert_int_to_bool_array(error_level, 2)
-        type_info = type_info + convert_int_to_bool_array(mask_pattern, 3)
-
-        error_code_list = bch_15_5_division(type_info)
-        type_info = type_info + list(map(lambda i: True if i == 1 else False, error_code_list))
-
-        type_info_xor_array = convert_int_to_bool_array(0x5412, 15)
-        for i in range(len(type_info)):
-            type_info[i] = type_info[i] ^ type_info_xor_array[i]
+        rows, columns, shifts = FormatInfo.get_coordinates(version)
+        self.value[rows, columns] = (format_words[error_level << 3 | mask_pattern] >> shifts) & 1
 
-        # Those bits are mapped in VERY SPECIFIC PLACES.
-        for i in range(6):
-            # Below upper left position marker
-            self.value[8, i] = QRModule.from_condition(type_info[i])
-            # Left of the upper left position marker
-            self.value[i, 8] = QRModule.from_condition(type_info[14 - i])
+    @staticmethod
+    def get_coordinates(version: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gets where the format info bits go, building them on the first call.
+        The module at (rows[i], columns[i]) is bit shifts[i] of the format word (0 is the least significant.)
 
-        for i in range(7):
-            # Below the upper right position marker
-            self.value[8, -i - 1] = QRModule.from_condition(type_info[14 - i])
-            # Right of the lower left position marker
-            self.value[-i - 1, 8] = QRModule.from_condition(type_info[i])
+        :param version:
+        :return: Tuple of read-only np.ndarray (rows, columns, bit shifts), 30 modules each.
+        """
+        if version not in FormatInfo.coordinates:
+            length = 17 + version * 4
+            # Those bits are mapped in VERY SPECIFIC PLACES. Bit i here is the i-th from the most significant.
+            placements = []
+            for i in range(6):
+                # Below upper left position marker
+                placements.append((8, i, i))
+                # Left of the upper left position marker
+                placements.append((i, 8, 14 - i))
+            for i in range(7):
+                # Below the upper right position marker
+                placements.append((8, length - i - 1, 14 - i))
+                # Right of the lower left position marker
+                placements.append((length - i - 1, 8, i))
+            placements += [(8, length - 8, 7), (7, 8, 8), (8, 8, 7), (8, 7, 6)]
+
+            rows, columns, bits = (np.array(values) for values in zip(*placements))
+            coordinates = (rows, columns, 14 - bits)
+            for array in coordinates:
+                array.flags.writeable = False
+            FormatInfo.coordinates[version] = coordinates
+        return FormatInfo.coordinates[version]
 
-        self.value[8, -8] = QRModule.from_condition(type_info[7])
+    @staticmethod
+    def get_stack(version: int, error_level: int) -> np.ndarray:
+        """
+        Gets the format info of all the 8 mask patterns, building them on the first call.
 
-        self.value[7, 8] = QRModule.from_condition(type_info[8])
-        self.value[8, 8] = QRModule.from_condition(type_info[7])
-        self.value[8, 7] = QRModule.from_condition(type_info[6])
+        :param version:
+        :param error_level:
+        :return: read-only (8, n, n) np.ndarray of QRM, indexed by mask pattern ID. Null outside of the format info.
+        """
+        key = (version, error_level)
+        if key not in FormatInfo.stacks:
+            length = 17 + version * 4
+            rows, columns, shifts = FormatInfo.get_coordinates(version)
+            words = format_words[error_level << 3 | np.arange(8)]
+            stack = module_array(shape=(8, length, length))
+            stack[:, rows, columns] = (words[:, np.newaxis] >> shifts) & 1
+            stack.flags.writeable = False
+            FormatInfo.stacks[key] = stack
+        return FormatInfo.stacks[key]
 
     @staticmethod
     def get_name_from_error_type(error_type: int):
@@ -227,120 +338,311 @@ class FormatInfo(QRMatrix):
             return "Invalid"
 
 
-def create_8bit_data_code(raw_text: str, data_code_capacity: int) -> List:
-    length = len(raw_text)
-    if length + 2 > data_code_capacity:
-        raise ValueError("Data too long! You cannot fit {0} ({1}-char long text) into {2}-code long data code!".format(
-            raw_text, length, data_code_capacity
+class VersionInfo(QRMatrix):
+    """
+    Version information. Only present in version 7 or above; empty for smaller versions.
+    """
+
+    # version -> (rows, columns, bit shifts) of the version info modules.
+    coordinates: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def __init__(self, version: int):
+        """
+        Creates Version-info-filled QRMatrix.
+
+        :param version:
+        """
+        super(VersionInfo, self).__init__(version)
+        if version < 7:
+            return
+
+        rows, columns, shifts = VersionInfo.get_coordinates(version)
+        self.value[rows, columns] = (version_words[version] >> shifts) & 1
+
+    @staticmethod
+    def get_coordinates(version: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gets where the version info bits go, building them on the first call.
+        The module at (rows[i], columns[i]) is bit shifts[i] of the version word (0 is the least significant.)
+
+        :param version: 7 ~ 40
+        :return: Tuple of read-only np.ndarray (rows, columns, bit shifts), 36 modules each.
+        """
+        if version not in VersionInfo.coordinates:
+            length = 17 + version * 4
+            # Those bits are mapped in 3x6 blocks, starting from the least significant bit.
+            shifts = np.arange(18)
+            # Left of the upper right position marker, and above the lower left position marker.
+            rows = np.concatenate([shifts // 3, length - 11 + shifts % 3])
+            columns = np.concatenate([length - 11 + shifts % 3, shifts // 3])
+            coordinates = (rows, columns, np.concatenate([shifts, shifts]))
+            for array in coordinates:
+                array.flags.writeable = False
+            VersionInfo.coordinates[version] = coordinates
+        return VersionInfo.coordinates[version]
+
+
+class FunctionPatternTemplate:
+    """
+    A cache of payload-independent function patterns per version.
+    Position markers, timing pattern, mini position markers and version info only depend on the version,
+    so they are built once and new symbols start from a copy.
+    """
+
+    # version -> (read-only base matrix value, read-only reserved modules mask)
+    cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @staticmethod
+    def get(version: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gets the function pattern template for the version, building it on the first call.
+
+        :param version:
+        :return: Tuple of (base, reserved). base is 2-D np.ndarray of QRM with all the function patterns placed
+            (format info area is left null,) and reserved is 2-D np.ndarray of bool which is True
+            where data must NOT be placed (function patterns AND format info area.) Both are read-only.
+        """
+        if version not in FunctionPatternTemplate.cache:
+            FunctionPatternTemplate.cache[version] = FunctionPatternTemplate.build(version)
+        return FunctionPatternTemplate.cache[version]
+
+    @staticmethod
+    def build(version: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Builds the function pattern template for the version without looking at the cache.
+
+        :param version:
+        :return: See get()
+        """
+        qr_matrix = QRMatrix(version=version)
+        qr_matrix.overwrite_with(TimingPattern(version=version))
+
+        qr_matrix.place(PositionMarker.create_marker_at(PositionMarker.UPPER_LEFT), 0, 0)
+        qr_matrix.place(PositionMarker.create_marker_at(PositionMarker.UPPER_RIGHT), 0, -8)
+        qr_matrix.place(PositionMarker.create_marker_at(PositionMarker.LOWER_LEFT), -8, 0)
+
+        for r, c in MiniPositionMarker.get_centers(version):
+            qr_matrix.place(MiniPositionMarker.create(), r - 2, c - 2)
+
+        qr_matrix.overwrite_with(VersionInfo(version=version))
+
+        base = qr_matrix.value
+        # Format info bits depend on the mask and the error level, but its area is always reserved.
+        format_area = QRModule.null_value != FormatInfo(version=version, error_level=0, mask_pattern=0).value
+        reserved = (QRModule.null_value != base) | format_area
+
+        base.flags.writeable = False
+        reserved.flags.writeable = False
+        return base, reserved
+
+    @staticmethod
+    def create_base(version: int) -> QRMatrix:
+        """
+        Creates a new QRMatrix which has all the function patterns placed, copying from the template.
+
+        :param version:
+        :return: QRMatrix, safe to mutate.
+        """
+        base, _ = FunctionPatternTemplate.get(version)
+        result = QRMatrix(version=version)
+        np.copyto(result.value, base)
+        return result
+
+
+class DataPlacementPath:
+    """
+    A cache of the order in which data modules are placed, per version.
+
+    How we place the data:
+    we start from bottom right, and look at the two columns (the right one and the left one) at a time.
+    We go UP first, placing a bit on the right and then on the left for each row, skipping reserved modules.
+    When we hit the edge, we move to the next two columns on the left and flip the vertical direction.
+    The vertical timing pattern (column 6) is skipped entirely, shifting the remaining pairs by one.
+    """
+
+    # version -> read-only 1-D np.ndarray of flat indices (row * length + column,) in placement order.
+    cache: Dict[int, np.ndarray] = {}
+
+    @staticmethod
+    def get(version: int) -> np.ndarray:
+        """
+        Gets the placement path for the version, building it on the first call.
+
+        :param version:
+        :return: read-only 1-D np.ndarray of flat indices into the matrix. Its length is the data module count.
+        """
+        if version not in DataPlacementPath.cache:
+            DataPlacementPath.cache[version] = DataPlacementPath.build(version)
+        return DataPlacementPath.cache[version]
+
+    @staticmethod
+    def build(version: int) -> np.ndarray:
+        """
+        Builds the placement path for the version without looking at the cache.
+
+        :param version:
+        :return: See get()
+        """
+        _, reserved = FunctionPatternTemplate.get(version)
+        length = reserved.shape[0]
+
+        # Right column of each column pair, from right to left. Pairs left to the timing pattern shift by one.
+        rights = np.arange(length - 1, 0, -2)
+        rights[rights <= 6] -= 1
+
+        # Even pairs go UP, odd pairs go DOWN. Each row visits the right column first, then the left one.
+        going_up = (0 == np.arange(len(rights)) % 2)[:, np.newaxis]
+        rows = np.where(going_up, np.arange(length)[::-1], np.arange(length))
+        rows = np.repeat(rows, 2, axis=1)
+        columns = rights[:, np.newaxis] - np.tile([0, 1], length)
+
+        path = (rows * length + columns).ravel()
+        path = path[~reserved.ravel()[path]]
+        path.flags.writeable = False
+        return path
+
+
+def create_8bit_data_code(raw_text: Union[str, bytes, memoryview], data_code_capacity: int, version: int = 1) -> List:
+    """
+    Creates data codes in 8-bit (byte) mode.
+
+    :param raw_text: str is encoded in UTF-8 once. bytes-like objects are read in place, not converted to str.
+    :param data_code_capacity:
+    :param version: decides the width of the length field.
+    :return: data codes
+    """
+    data = raw_text.encode('utf-8') if isinstance(raw_text, str) else memoryview(raw_text).cast('B')
+    length = len(data)
+    length_bits = Mode.get_length_bits(Mode.BYTE, version)
+    if 4 + length_bits + 8 * length > data_code_capacity * 8:
+        raise ValueError("Data too long! You cannot fit {0}-byte long data into {1}-code long data code!".format(
+            length, data_code_capacity
         ))
-    header = convert_int_to_bool_array(0x4, 4)  # constant
-    header += convert_int_to_bool_array(length, 8)
-    text_ascii_bytes = []
-    # In case of 8-bit mode, just convert chars into ascii codes.
-    for char in raw_text:
-        text_ascii_bytes += convert_int_to_bool_array(ord(char), 8)
-    # This is just an 'endcode' - 0b0000
-    text_ascii_bytes += convert_int_to_bool_array(0, 4)
-
-    total_bits = header + text_ascii_bytes
-
-    count = 0
-    data_codes = []
-    while True:
-        slice = total_bits[8 * count:8 * (count + 1)]
-        if 0 == len(slice):
-            break
-        total = 0
-        for i in range(8):
-            total += pow(2, 7 - i) if slice[i] else 0
-        data_codes.append(total)
-        count += 1
-
-    count = 0
-    while data_code_capacity > len(data_codes):
-        if 0 == count % 2:
-            # encoded_data = encoded_data + convert_int_to_bool_array(0xec, 8)
-            data_codes.append(0xec)
-        else:
-            # encoded_data = encoded_data + convert_int_to_bool_array(0x11, 8)
-            data_codes.append(0x11)
-        count += 1
+    writer = BitWriter()
+    writer.write(Mode.BYTE, 4)  # constant
+    writer.write(length, length_bits)
+    # In case of 8-bit mode, the bytes go in as they are.
+    writer.write_bytes(data)
+    # This is just an 'endcode' - 0b0000, which can be cut short if the data is almost full.
+    writer.write(0, min(4, data_code_capacity * 8 - len(writer)))
+    writer.pad_to_byte()
 
-    return data_codes
+    return append_pad_codes(list(writer.to_bytes()), data_code_capacity)
 
 
-def create_alphanumeric_data_code(raw_text: str, text_capacity: int, data_code_capacity: int) -> List:
-    char_id_dict = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+def create_alphanumeric_data_code(raw_text: str, text_capacity: int, data_code_capacity: int,
+                                  version: int = 1) -> List:
     length = len(raw_text)
-    encoded_data = convert_int_to_bool_array(2, 4) + convert_int_to_bool_array(length, 9)  # constant
-    raw_text_buffer = raw_text
-    while True:
-        # char cutout
-        char_pair = raw_text_buffer[0:2]
-        raw_text_buffer = raw_text_buffer[2:]
-
-        if 2 == len(char_pair):
-            # If two chars can be obtained...
-            first_id = char_id_dict.find(char_pair[0])
-            second_id = char_id_dict.find(char_pair[1])
-            total = first_id * 45 + second_id
-            partial_data = convert_int_to_bool_array(total, 11)
-        else:
-            # If only one char is remaining...
-            char_id = char_id_dict.find(char_pair[0])
-            partial_data = convert_int_to_bool_array(char_id, 6)
-
-        encoded_data = encoded_data + partial_data
-        if 0 == len(raw_text_buffer):
-            break
+    writer = BitWriter()
+    writer.write(Mode.ALPHANUMERIC, 4)  # constant
+    writer.write(length, Mode.get_length_bits(Mode.ALPHANUMERIC, version))
+    # Chars are paired up and converted all at once.
+    write_alphanumeric(writer, raw_text.encode('latin-1'))
 
     # If the length of the raw text is less than text capacity, we need to add '0000'
     if length < text_capacity:
-        for _ in range(4):
-            encoded_data.append(False)
+        writer.write(0, 4)
 
     # We then try to separate the encoded data into 8-bit slices.
     # Converting this back to integer will give us the 'DATA CODEs'
     # with which we will need to calculate the error correction code.
-    count = 0
-    data_codes = []
-    while True:
-        slice = encoded_data[8 * count:8 * (count + 1)]
-        # print(slice)
-        if 0 == len(slice):
-            break
-        if 8 != len(slice):
-            # insufficient slice will be padded with False
-            while 8 != len(slice):
-                encoded_data.append(False)  # also append to encoded data
-                slice.append(False)
-        total = 0
-        for i in range(8):
-            total += pow(2, 7 - i) if slice[i] else 0
-        data_codes.append(total)
-        count += 1
-
-    # If the number of DATA CODES is less than data code capacity,
-    # We need to add 0b11101100 and 0b00010001 alternatively
-    # until we reach the 9 data code limit.
-    count = 0
-    while data_code_capacity > len(data_codes):
-        if 0 == count % 2:
-            encoded_data = encoded_data + convert_int_to_bool_array(0xec, 8)
-            data_codes.append(0xec)
-        else:
-            encoded_data = encoded_data + convert_int_to_bool_array(0x11, 8)
-            data_codes.append(0x11)
-        count += 1
+    # insufficient slice will be padded with False
+    writer.pad_to_byte()
+
+    return append_pad_codes(check_data_length(writer, raw_text, data_code_capacity), data_code_capacity)
+
+
+def create_numeric_data_code(raw_text: str, data_code_capacity: int, version: int = 1) -> List:
+    writer = BitWriter()
+    writer.write(Mode.NUMERIC, 4)  # constant
+    writer.write(len(raw_text), Mode.get_length_bits(Mode.NUMERIC, version))
+    # Digits are grouped in threes and converted all at once.
+    write_numeric(writer, raw_text.encode('latin-1'))
+
+    # 'endcode' - 0b0000, which can be cut short if the data is almost full.
+    writer.write(0, max(0, min(4, data_code_capacity * 8 - len(writer))))
+    writer.pad_to_byte()
+
+    return append_pad_codes(check_data_length(writer, raw_text, data_code_capacity), data_code_capacity)
+
+
+def create_kanji_data_code(raw_text: str, data_code_capacity: int, version: int = 1) -> List:
+    writer = BitWriter()
+    writer.write(Mode.KANJI, 4)  # constant
+    writer.write(len(raw_text), Mode.get_length_bits(Mode.KANJI, version))
+    # Chars are looked up in the precomputed Shift-JIS table and converted all at once.
+    write_kanji(writer, ShiftJISTable.encode(raw_text))
+
+    # 'endcode' - 0b0000, which can be cut short if the data is almost full.
+    writer.write(0, max(0, min(4, data_code_capacity * 8 - len(writer))))
+    writer.pad_to_byte()
+
+    return append_pad_codes(check_data_length(writer, raw_text, data_code_capacity), data_code_capacity)
+
+
+def create_segmented_data_code(raw_text: Union[str, bytes, memoryview], data_code_capacity: int,
+                               version: int, segments: Optional[List] = None) -> List:
+    """
+    Creates data codes switching modes in the middle, so that the data codes get as short as possible.
+
+    :param raw_text: str, whose byte mode segments are encoded in UTF-8 and kanji mode segments in Shift-JIS.
+        bytes-like objects are used as they are.
+    :param data_code_capacity:
+    :param version: decides the width of the length fields, which affects where to switch modes.
+    :param segments: result of split_segments() for the version, if already known.
+    :return: data codes
+    """
+    if segments is None:
+        segments = split_segments(raw_text, version)
+    writer = BitWriter()
+    write_segments(writer, segments, version)
+
+    # 'endcode' - 0b0000, which can be cut short if the data is almost full.
+    writer.write(0, max(0, min(4, data_code_capacity * 8 - len(writer))))
+    writer.pad_to_byte()
+
+    return append_pad_codes(check_data_length(writer, raw_text, data_code_capacity), data_code_capacity)
+
+
+def check_data_length(writer: BitWriter, raw_text: str, data_code_capacity: int) -> List:
+    """
+    Gets the data codes from the writer, making sure that they fit in the capacity.
+
+    :param writer:
+    :param raw_text: used in the error message
+    :param data_code_capacity:
+    :return: data codes
+    """
+    data_codes = list(writer.to_bytes())
+    if len(data_codes) > data_code_capacity:
+        raise ValueError("Data too long! You cannot fit {0} ({1}-char long text) into {2}-code long data code!".format(
+            raw_text, len(raw_text), data_code_capacity
+        ))
+    return data_codes
 
+
+def append_pad_codes(data_codes: List, data_code_capacity: int) -> List:
+    """
+    If the number of DATA CODES is less than data code capacity,
+    We need to add 0b11101100 and 0b00010001 alternatively until we reach the limit.
+
+    :param data_codes: data codes, mutated.
+    :param data_code_capacity:
+    :return: data_codes itself
+    """
+    pad_count = data_code_capacity - len(data_codes)
+    if pad_count > 0:
+        data_codes += [0xec, 0x11] * (pad_count // 2) + [0xec] * (pad_count % 2)
     return data_codes
 
 
 def place_data(base: QRMatrix, raw_data_code: List, rs_block_info: List, error_code_word_count: int,
-               mask_id: int) -> QRMatrix:
+               mask_id: Union[int, str], error_level: Optional[int] = None) -> QRMatrix:
     """
     Places data on QRMatrix, and RETURNS DATA PART ONLY.
-    :param mask_id:
+    The applied mask pattern ID is stored in mask_id of the result.
+    :param mask_id: 0 ~ 7, or 'auto' to select the mask with the least penalty.
+    :param error_level: Required for 'auto' mask, because format info is a part of the evaluated symbol.
     :param error_code_word_count:
     :param base: Base QRMatrix, THIS HAS TO HAVE ALL THE NECESSARY MODULES READY!!
     :param raw_data_code: RAW DATA, DO NOT INCLUDE ERROR CORRECTING CODES!
@@ -348,197 +650,161 @@ def place_data(base: QRMatrix, raw_data_code: List, rs_block_info: List, error_c
     :return:
     """
 
-    data_code = copy.deepcopy(raw_data_code)
+    data_code = np.asarray(raw_data_code, dtype=np.uint8)
+    binary_code = np.unpackbits(interleave_rs_blocks(data_code[np.newaxis, :], rs_block_info, error_code_word_count)[0])
+
+    data_buffer = QRMatrix(version=base.version)
+
+    # The zigzag order only depends on the version, so we just scatter the bits along the cached path.
+    path = DataPlacementPath.get(base.version)
+    if len(binary_code) > len(path):
+        raise ValueError("Data too long! {} bits cannot be placed in {} data modules.".format(
+            len(binary_code), len(path)))
+    np.put(data_buffer.value, path[:len(binary_code)], binary_code)
+    # Some modules may not be used (remainder bits.) Those are treated as OFF module.
+    np.put(data_buffer.value, path[len(binary_code):], QRModule.off_value)
+
+    if 'auto' == mask_id:
+        if error_level is None:
+            raise ValueError("error_level is required to select the mask automatically.")
+        mask_id = select_mask_pattern(data_buffer, error_level)
+
+    _, reserved = FunctionPatternTemplate.get(base.version)
+    # We do not flip base value stuff.
+    np.bitwise_xor(data_buffer.value, MaskPattern.get_plane(base.version, mask_id), out=data_buffer.value,
+                   where=~reserved)
+    data_buffer.mask_id = mask_id
+
+    return data_buffer
+
+
+def interleave_rs_blocks(data_codes: np.ndarray, rs_block_info: List, error_code_word_count: int) -> np.ndarray:
+    """
+    Splits the data codes into RS blocks, calculates their error codes and interleaves them all,
+    for many symbols of the same version and error level at once.
+
+    :param data_codes: (symbols, data code count) array. RAW DATA, DO NOT INCLUDE ERROR CORRECTING CODES!
+    :param rs_block_info: List of Tuple of (RS block data code count, number of that RS blocks.)
+    :param error_code_word_count: of the whole symbol.
+    :return: (symbols, data code count + error code count) np.ndarray of uint8, in the order of placement.
+    """
+    symbol_count = data_codes.shape[0]
+    block_count = sum(info[1] for info in rs_block_info)
+    # For each data code, calculate the error codes.
+    ecc_word_count = error_code_word_count // block_count
+    block_lengths = np.repeat([info[0] for info in rs_block_info], [info[1] for info in rs_block_info])
 
-    rs_blocks = []
+    # Data codes of each RS block. Shorter blocks are padded so that they can be interleaved as an array.
+    data_blocks = np.zeros(shape=(symbol_count, block_count, block_lengths.max()), dtype=np.uint8)
+    error_blocks = np.empty(shape=(symbol_count, block_count, ecc_word_count), dtype=np.uint8)
 
     # split the data code according to the RS block information.
+    # RS blocks of the same length are encoded all at once, across all the symbols.
     current_index = 0
+    block_index = 0
     for info in rs_block_info:
         word_count = info[0]
         repeat_count = info[1]
-        for _ in range(repeat_count):
-            rs_blocks.append(data_code[current_index:current_index + word_count])
-            current_index = current_index + word_count
+        blocks = data_codes[:, current_index:current_index + word_count * repeat_count]
+        blocks = blocks.reshape(symbol_count * repeat_count, word_count)
+        error_codes = ReedSolomonCache.encode_blocks(blocks, ecc_word_count)
+        data_blocks[:, block_index:block_index + repeat_count, :word_count] = \
+            blocks.reshape(symbol_count, repeat_count, word_count)
+        error_blocks[:, block_index:block_index + repeat_count] = \
+            error_codes.reshape(symbol_count, repeat_count, ecc_word_count)
+        current_index = current_index + word_count * repeat_count
+        block_index = block_index + repeat_count
+
+    if current_index != data_codes.shape[1]:
+        raise ValueError("{} data codes do not match the RS blocks, which need {}.".format(
+            data_codes.shape[1], current_index))
+
+    # Interleave the blocks: 1st code of each block, then 2nd code of each block, and so on.
+    # earlier RS blocks may run out of data code at the end. in such case, carry on.
+    # All the data codes come first, then all the error codes.
+    is_padding = (np.arange(block_lengths.max())[:, np.newaxis] >= block_lengths).ravel()
+    interleaved_data = data_blocks.transpose(0, 2, 1).reshape(symbol_count, -1)[:, ~is_padding]
+    interleaved_error = error_blocks.transpose(0, 2, 1).reshape(symbol_count, -1)
+    return np.concatenate([interleaved_data, interleaved_error], axis=1)
 
-    # For each data code, calculate the error codes.
-    ecc_word_count = int(error_code_word_count / len(rs_blocks))
-    rs_block_error_codes = []
 
-    rs.init_tables(0x11d)
-    for rs_block in rs_blocks:
-        total_length = len(rs_block) + ecc_word_count
-        gen = rs.rs_generator_poly_all(total_length)
-        mesecc = rs.rs_encode_msg(rs_block, ecc_word_count, gen=gen[ecc_word_count])
+def create_data_code(raw_text: Union[str, bytes, memoryview], error_level: int,
+                     version: Union[int, str] = 'auto') -> Tuple[int, List]:
+    """
+    Creates data codes of the text, switching modes so that the data codes get as short as possible.
+
+    :param raw_text: See create_qr_code()
+    :param error_level: FormatInfo.ERROR_*
+    :param version: 1 ~ 40, or 'auto' to pick the smallest version the text fits in.
+    :return: Tuple of (version, data codes.)
+    """
+    if not isinstance(raw_text, str):
+        raw_text = bytes(raw_text)
+    # Segments only change with the length field widths, which are the same within a version class.
+    # The last segments tried while selecting the version are the ones for the selected version.
+    tried_segments = [None]
+    if 'auto' == version:
+        def bit_length_for(v: int) -> int:
+            tried_segments[0] = split_segments(raw_text, v)
+            return get_segments_bit_length(tried_segments[0], v)
+
+        version = specs.select_version_by(bit_length_for, error_level)
+    data_code = create_segmented_data_code(raw_text=raw_text,
+                                           data_code_capacity=specs.get_data_code_capacity(version, error_level),
+                                           version=version, segments=tried_segments[0])
+    return version, data_code
+
+
+def create_qr_code(raw_text: Union[str, bytes, memoryview], error_level: int, version: Union[int, str] = 'auto',
+                   mask_id: Union[int, str] = 'auto') -> QRMatrix:
+    """
+    Creates a complete QR code of the text, switching modes so that the data codes get as short as possible.
+
+    :param raw_text: text to encode. str is encoded in UTF-8 where byte mode is used, and in Shift-JIS where kanji
+        mode is used.
+    :param error_level: FormatInfo.ERROR_*
+    :param version: 1 ~ 40, or 'auto' to pick the smallest version the text fits in.
+    :param mask_id: 0 ~ 7, or 'auto' to select the mask with the least penalty.
+    :return: QRMatrix, with every module assigned.
+    """
+    version, data_code = create_data_code(raw_text, error_level, version)
+
+    qr_matrix = FunctionPatternTemplate.create_base(version=version)
+    data_matrix = place_data(base=qr_matrix, raw_data_code=data_code,
+                             rs_block_info=specs.get_rs_block_info(version, error_level),
+                             error_code_word_count=specs.get_error_code_word_count(version, error_level),
+                             mask_id=mask_id, error_level=error_level)
+    qr_matrix.merge(FormatInfo(version=version, error_level=error_level, mask_pattern=data_matrix.mask_id))
+    qr_matrix.merge(data_matrix, allow_empties=False)
+    return qr_matrix
 
-        print([x for x in gen[ecc_word_count]])
 
-        rs_block_error_codes.append(mesecc)
-        # i_fx = copy.deepcopy(rs_block)
-        # i_fx = i_pad_codes(i_fx, gx_word_count)
-        # rs_block_error_codes.append(i_galois_division(i_fx, GaloisDividerDictionary.get_divider_for(gx_word_count)))
+def select_mask_pattern(data: QRMatrix, error_level: int) -> int:
+    """
+    Applies all the 8 mask patterns to the data at once, and picks the one with the least penalty.
+    Candidates are evaluated as complete symbols (function patterns and format info included.)
 
-    binary_code = []
-    # First, interleave all the rs_blocks.
-    code_index = 0
-    # earlier RS blocks may run out of data code at the end. in such case, carry on.
-    while True:
-        continue_count = 0
-        for block_id in range(len(rs_blocks)):
-            if code_index >= len(rs_block_error_codes[block_id]):
-                continue_count += 1
-                continue
-            binary = convert_int_to_bool_array(rs_block_error_codes[block_id][code_index], 8)
-            binary_code += binary
-        if continue_count == len(rs_blocks):
-            break
-        code_index += 1
-
-    i_rs_block_error_codes = [x for x in rs_block_error_codes[0]]
-    print(i_rs_block_error_codes)
-
-    # +) 25*25 All matrix
-    # -) 8*8*3 Placement Pattern
-    # -) 5*5   Mini Placement Pattern
-    # -) 9*2   Timing pattern
-    # -) 15*2  Metadata
-
-    error_area_start_index = len(data_code)*8
-
-    # Then, we interleave all the rs_block_error_codes.
-    """
-    code_index = 0
-    while True:
-        continue_count = 0
-        for block_id in range(len(rs_block_error_codes)):
-            if code_index >= len(rs_block_error_codes[block_id]):
-                continue_count += 1
-                continue
-            binary = convert_int_to_bool_array(rs_block_error_codes[block_id][code_index], 8)
-            binary_code += binary
-        if continue_count == len(rs_block_error_codes):
-            break
-        code_index += 1
+    :param data: Data-only QRMatrix, NOT masked yet.
+    :param error_level: FormatInfo.ERROR_*
+    :return: mask pattern ID, 0 ~ 7
     """
+    return int(select_mask_patterns(data.value[np.newaxis], data.version, error_level)[0])
 
-    data_buffer = QRMatrix(version=base.version)
 
-    # How we place the data:
-    # we start from bottom right. Then we decide which vertical direction to 'go when the situation requires first.'
-    # (you can pick from up and down. We'll go UP this time)
-    # After placing a bit in bottom right corner, we look at the two columns
-    # (the one that you put the data + the one to the left.)
-    # If you are currently on the right:
-    #   Try going LEFT. BUT if the fixed pattern is already sitting there,
-    #   You need to go whichever vertical direction you're going.
-    #   If this is the first one it's probably UP in this case
-    # If you are currently on the left:
-    #   Look at the block to the current vertical direction.
-    #   If the block is vacant...
-    #       Go in that direction. If the right neighbour is vacant, place there. if not, place it here.
-    #   If the block is taken...
-    #       Try looking at the next neighbour in the current vertical direction. Do the same.
-    #       If you ran out of the space...
-    #           Give up going in the direction, go LEFT and place the bit there.
-    #           This ALSO causes the VERTICAL DIRECTION to FLIP!
-
-    # we have created `buffer` all the way up.
-    # FIRST INDEX IS DOWN, SECOND INDEX IS RIGHT.
-
-    r = base.length - 1
-    c = base.length - 1
-    code_index = 0
-    is_going_up = True
-    is_on_right = True
-
-    while True:
-        if code_index == error_area_start_index:
-            print("Error area is starting from row-wise {}, column-wise {}. We're going {} at this point".format(r, c,
-                                                                                                                 "up" if is_going_up else "down"))
-        # Place the data here
-        assert base.value[r, c].is_null()
-        assert data_buffer.value[r, c].is_null()
-        # For masking reason, data will be saved in different place
-        data_buffer.value[r, c] = QRModule.from_condition(binary_code[code_index])
-        # increment the index
-        code_index = code_index + 1
-
-        if code_index == len(binary_code):
-            break
-
-        # Are you on the right?
-        if is_on_right:
-            # Try going to left... is it vacant?
-            if base.value[r, c - 1].is_null():
-                c = c - 1  # then it's safe to put there
-                is_on_right = False
-                continue
-            else:
-                # Then try going into current vertical directions until you hit vacancy.
-                while True:
-                    r = r + (-1 if is_going_up else 1)
-                    if base.value[r, c].is_null():
-                        break
-                    assert 0 <= r < base.length, "You're not supposed to go out of the buffer like this."
-                continue
-        else:
-            # You're on the left
-            # Check the neighbouring block in current direction.
-            checking_row = r
-            while True:
-                checking_row = checking_row + (-1 if is_going_up else 1)
-                # if you end up running out of buffer during this process.
-                # just go left and flip the direction. You're considered to be on right after this.
-                if not (0 <= checking_row < base.length):
-                    # But be careful not to step on other data.
-                    checking_column = c - 1
-                    checking_row = r
-                    while True:
-                        assert 0 <= checking_column < base.length, "You ran out of buffer in column direction"
-                        # try to find vacancy in the next left column.
-                        if base.value[checking_row, checking_column].is_null():
-                            break
-                        checking_row = checking_row - 1
-                        # If for some reason there are none, we need to check next column.
-                        # We preserve is_on_right at this point.
-                        if not (0 <= checking_row < base.length):
-                            checking_column = checking_column - 1
-                            checking_row = r  # reset checking row to try again
-                    r = checking_row
-                    c = checking_column
-                    is_going_up = not is_going_up
-                    is_on_right = True
-                    break
-                # See the one to the right. is it vacant?
-                if base.value[checking_row, c + 1].is_null():
-                    # Right one is vacant!
-                    r = checking_row
-                    c = c + 1
-                    is_on_right = True
-                    break
-                elif base.value[checking_row, c].is_null():
-                    # Left one is vacant!
-                    r = checking_row
-                    is_on_right = False
-                    break
-                # Else, we need to continue going up or down.
-            continue
-
-    # return data_buffer
-    for r in range(base.length):
-        for c in range(base.length):
-            # Some modules may not be used (e.g. Ver.5-Q, Binary mode.)
-            # 'True vacancy,' which is occupied by neither data nor metadata,
-            # seems to be treated as ON module - but we don't know for sure.
-            if not base.value[r, c].is_null():
-                # We do not flip base value stuff.
-                continue
-            if data_buffer.value[r, c].is_null():
-                print("Null value detected at R: {0}, C: {1}, padded as True".format(r, c))
-                data_buffer.value[r, c] = QRModule.off()
-            if MaskPattern.calculate(r, c, mask_id):
-                if data_buffer.value[r, c].is_null():
-                    print("Null value detected at R: {0}, C: {1}".format(r, c))
-                data_buffer.value[r, c].flip()
+def select_mask_patterns(data_values: np.ndarray, version: int, error_level: int) -> np.ndarray:
+    """
+    select_mask_pattern() for many symbols of the same version and error level at once.
 
-    return data_buffer
+    :param data_values: (symbols, n, n) array of data-only modules, NOT masked yet.
+    :param version:
+    :param error_level: FormatInfo.ERROR_*
+    :return: np.ndarray of mask pattern IDs, one for each symbol.
+    """
+    base, reserved = FunctionPatternTemplate.get(version)
+    format_infos = FormatInfo.get_stack(version, error_level)
+
+    # (symbols, 8, n, n) stack of candidate symbols.
+    candidates = np.where(reserved, base, data_values[:, np.newaxis] ^ MaskPattern.get_planes(version))
+    candidates = np.where(QRModule.null_value != format_infos, format_infos, candidates)
+
+    return np.argmin(MaskPenalty.calculate(candidates), axis=1)
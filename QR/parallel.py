@@ -0,0 +1,153 @@
+"""
+Encodes many payloads on a process pool.
+
+Work is done in two rounds:
+1. Workers create data codes of their shard of payloads. They are small, so they are sent back.
+2. The symbol count of each version is known by then, so a shared memory block is allocated for all of them,
+   and workers write finished symbols straight into it. Symbols themselves are never pickled.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from QR.batch import encode_data_codes, group_data_codes
+
+
+class SharedSymbols:
+    """
+    Symbols of all the versions, laid out one version after another in a single shared memory block.
+    The owner has to call close() (or use it as a context manager) to release the block.
+    """
+
+    def __init__(self, counts: Dict[int, int], name: Optional[str] = None):
+        """
+        :param counts: Dict of version -> number of symbols.
+        :param name: name of an existing block to attach to. A new block is created if None.
+        """
+        self.layout: Dict[int, Tuple[int, int]] = {}
+        offset = 0
+        for version in sorted(counts):
+            self.layout[version] = (offset, counts[version])
+            length = 17 + version * 4
+            offset += counts[version] * length * length
+
+        self.owner = name is None
+        # Zero-size blocks are not allowed.
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=max(1, offset))
+        self.indices: Dict[int, np.ndarray] = {}
+
+    def get_symbols(self, version: int) -> np.ndarray:
+        """
+        :param version:
+        :return: (symbols, n, n) np.ndarray of uint8 on the shared memory. Valid until close() is called.
+        """
+        offset, count = self.layout[version]
+        length = 17 + version * 4
+        return np.ndarray(shape=(count, length, length), dtype=np.uint8, buffer=self.memory.buf, offset=offset)
+
+    def get(self, version: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param version:
+        :return: Tuple of (indices of the payloads, symbols), like each value of encode_batch().
+        """
+        return self.indices[version], self.get_symbols(version)
+
+    def versions(self) -> List[int]:
+        return list(self.layout)
+
+    def close(self):
+        """
+        Detaches from the block, and frees it if this is the owner. Arrays from get() must not be used after this.
+        """
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def encode_parallel(payloads: Sequence[Union[str, bytes, memoryview]], error_level: int,
+                    version: Union[int, str] = 'auto', mask_id: Union[int, str] = 'auto',
+                    workers: Optional[int] = None, shard_size: int = 1024, chunk_size: int = 64) -> SharedSymbols:
+    """
+    encode_batch() on a process pool.
+
+    :param payloads: texts to encode. See create_qr_code()
+    :param error_level: FormatInfo.ERROR_*
+    :param version: 1 ~ 40 for all the payloads, or 'auto' to pick the smallest version for each payload.
+    :param mask_id: 0 ~ 7 for all the payloads, or 'auto' to select the mask with the least penalty for each payload.
+    :param workers: number of processes. CPU count if None.
+    :param shard_size: number of payloads each task handles.
+    :param chunk_size: See encode_batch()
+    :return: SharedSymbols holding the result. Close it after use.
+    """
+    if shard_size < 1:
+        raise ValueError("shard_size should be 1 or more.")
+    starts = range(0, len(payloads), shard_size)
+
+    # Workers have to share the resource tracker with this process. Otherwise a worker attaching to the block
+    # registers it to a tracker of its own, which frees the block when the worker exits.
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Round 1: data codes, whose lengths tell the version.
+        # memoryview cannot be pickled, so they are sent as bytes.
+        futures = [executor.submit(group_data_codes,
+                                   [bytes(payload) if isinstance(payload, memoryview) else payload
+                                    for payload in payloads[start:start + shard_size]],
+                                   error_level, version)
+                   for start in starts]
+        groups: Dict[int, Tuple[List[np.ndarray], List[np.ndarray]]] = {}
+        for start, future in zip(starts, futures):
+            for shard_version, (indices, data_codes) in future.result().items():
+                group = groups.setdefault(shard_version, ([], []))
+                group[0].append(indices + start)
+                group[1].append(data_codes)
+
+        result = SharedSymbols({shard_version: sum(len(indices) for indices in group[0])
+                                for shard_version, group in groups.items()})
+        try:
+            # Round 2: symbols, written into the shared memory.
+            futures = []
+            for shard_version, (indices, data_codes) in groups.items():
+                result.indices[shard_version] = np.concatenate(indices)
+                data_codes = np.concatenate(data_codes)
+                for start in range(0, len(data_codes), shard_size):
+                    futures.append(executor.submit(write_symbols, result.memory.name, result.layout, shard_version,
+                                                   start, data_codes[start:start + shard_size], error_level,
+                                                   mask_id, chunk_size))
+            for future in futures:
+                future.result()
+        except BaseException:
+            result.close()
+            raise
+
+    return result
+
+
+def write_symbols(name: str, layout: Dict[int, Tuple[int, int]], version: int, start: int, data_codes: np.ndarray,
+                  error_level: int, mask_id: Union[int, str], chunk_size: int):
+    """
+    Worker of encode_parallel(). Encodes the data codes and writes the symbols into the shared memory.
+
+    :param name: name of the shared memory block.
+    :param layout: SharedSymbols.layout of the block.
+    :param version:
+    :param start: index of the first symbol in the version.
+    :param data_codes: (symbols, data code capacity) array.
+    :param error_level: FormatInfo.ERROR_*
+    :param mask_id: 0 ~ 7, or 'auto'
+    :param chunk_size: See encode_batch()
+    """
+    shared = SharedSymbols({v: count for v, (_, count) in layout.items()}, name=name)
+    try:
+        shared.get_symbols(version)[start:start + len(data_codes)] = encode_data_codes(data_codes, version,
+                                                                                       error_level, mask_id,
+                                                                                       chunk_size)
+    finally:
+        shared.close()
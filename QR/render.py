@@ -0,0 +1,124 @@
+"""
+Renders symbols into image formats, straight from the module buffer.
+"""
+import struct
+import zlib
+from typing import Union
+
+import numpy as np
+
+from QR.objects import QRMatrix
+from QR.value_object import QRModule
+
+
+def get_dark_modules(symbol: Union[QRMatrix, np.ndarray], scale: int = 1, quiet_zone: int = 4) -> np.ndarray:
+    """
+    Gets the symbol as an image of dark pixels.
+
+    :param symbol: QRMatrix, or (n, n) array of module values (e.g. a symbol from encode_batch().)
+        Null modules are rendered light.
+    :param scale: pixels per module
+    :param quiet_zone: light margin around the symbol, in modules. The spec requires 4.
+    :return: (height, width) np.ndarray of bool, True for dark.
+    """
+    if scale < 1 or quiet_zone < 0:
+        raise ValueError("scale should be 1 or more, and quiet_zone should be 0 or more.")
+    value = symbol.value if isinstance(symbol, QRMatrix) else np.asarray(symbol)
+    dark = np.pad(QRModule.on_value == value, quiet_zone)
+    if 1 != scale:
+        dark = np.repeat(np.repeat(dark, scale, axis=0), scale, axis=1)
+    return dark
+
+
+def to_pbm(symbol: Union[QRMatrix, np.ndarray], scale: int = 1, quiet_zone: int = 4) -> bytes:
+    """
+    Renders the symbol as a binary PBM (P4) image, where each row is packed into bits and 1 is black.
+
+    :param symbol: See get_dark_modules()
+    :param scale: pixels per module
+    :param quiet_zone: light margin around the symbol, in modules.
+    :return: PBM file contents
+    """
+    dark = get_dark_modules(symbol, scale, quiet_zone)
+    header = 'P4\n{} {}\n'.format(dark.shape[1], dark.shape[0]).encode('ascii')
+    return header + np.packbits(dark, axis=1).tobytes()
+
+
+def to_png(symbol: Union[QRMatrix, np.ndarray], scale: int = 1, quiet_zone: int = 4) -> bytes:
+    """
+    Renders the symbol as a 1-bit grayscale PNG image.
+
+    :param symbol: See get_dark_modules()
+    :param scale: pixels per module
+    :param quiet_zone: light margin around the symbol, in modules.
+    :return: PNG file contents
+    """
+    dark = get_dark_modules(symbol, scale, quiet_zone)
+    height, width = dark.shape
+    # In grayscale, 0 is black. Each row starts with its filter type, 0 (None.)
+    rows = np.packbits(~dark, axis=1)
+    scanlines = np.concatenate([np.zeros(shape=(height, 1), dtype=np.uint8), rows], axis=1)
+
+    # width, height, bit depth 1, colour type 0 (grayscale), compression, filter and interlace methods.
+    header = struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + \
+        create_png_chunk(b'IHDR', header) + \
+        create_png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 9)) + \
+        create_png_chunk(b'IEND', b'')
+
+
+def to_svg(symbol: Union[QRMatrix, np.ndarray], scale: int = 1, quiet_zone: int = 4) -> str:
+    """
+    Renders the symbol as an SVG image with a single path.
+    Each horizontal run of dark modules becomes one rectangle in the path, rather than one per module.
+
+    :param symbol: See get_dark_modules()
+    :param scale: size of a module in the user units (pixels) of the image.
+    :param quiet_zone: light margin around the symbol, in modules.
+    :return: SVG document
+    """
+    dark = get_dark_modules(symbol, 1, quiet_zone)
+    size = dark.shape[0]
+    # +1 where a run starts, and -1 right after it ends. Both come in row-major order, so they pair up.
+    edges = np.diff(np.pad(dark, [(0, 0), (1, 1)]).astype(np.int8), axis=1)
+    rows, starts = np.nonzero(1 == edges)
+    _, ends = np.nonzero(-1 == edges)
+    path = ''.join(['M{} {}h{}v1H{}z'.format(start, row, end - start, start)
+                    for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist())])
+
+    return '<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{0}" viewBox="0 0 {1} {1}" ' \
+           'shape-rendering="crispEdges"><rect width="{1}" height="{1}" fill="#fff"/>' \
+           '<path d="{2}" fill="#000"/></svg>'.format(size * scale, size, path)
+
+
+# Half blocks indexed by (upper dark * 2 + lower dark.)
+HALF_BLOCKS = np.array([' ', '\u2584', '\u2580', '\u2588'])
+
+
+def to_terminal(symbol: Union[QRMatrix, np.ndarray], quiet_zone: int = 4, invert: bool = False) -> str:
+    """
+    Renders the symbol as text of Unicode half blocks, 2 rows of modules per line.
+
+    :param symbol: See get_dark_modules()
+    :param quiet_zone: light margin around the symbol, in modules.
+    :param invert: draw light modules instead of dark ones, for terminals with dark background.
+    :return: lines of text, without the trailing newline.
+    """
+    dark = get_dark_modules(symbol, 1, quiet_zone)
+    if invert:
+        dark = ~dark
+    if 0 != dark.shape[0] % 2:
+        # Lower half of the last line is left blank, that is, the background of the terminal.
+        dark = np.pad(dark, [(0, 1), (0, 0)])
+    chars = HALF_BLOCKS[dark[0::2].astype(np.intp) * 2 + dark[1::2]]
+    return '\n'.join(''.join(line) for line in chars)
+
+
+def create_png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    :param chunk_type: 4-byte chunk type, e.g. b'IHDR'
+    :param data: chunk data
+    :return: the chunk with its length and CRC.
+    """
+    return struct.pack('>I', len(data)) + chunk_type + data + \
+        struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
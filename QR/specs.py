@@ -0,0 +1,182 @@
+"""
+Version specs of QR codes.
+
+Every table here is indexed by [error_level, version], where error_level is the 2-bit value
+written in the format info (FormatInfo.ERROR_*: M = 0, L = 1, H = 2, Q = 3.)
+Column 0 is a placeholder since versions start from 1.
+"""
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+MIN_VERSION = 1
+MAX_VERSION = 40
+
+# Ranges of versions which share the same length field widths.
+version_classes = ((1, 9), (10, 26), (27, 40))
+
+# Error correcting code words per RS block.
+ecc_words_per_block = np.array([
+    # M
+    [0, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26,
+     26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28],
+    # L
+    [0, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28,
+     28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+    # H
+    [0, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28,
+     30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+    # Q
+    [0, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30,
+     28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+])
+
+# Number of RS blocks.
+rs_block_counts = np.array([
+    # M
+    [0, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16,
+     17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49],
+    # L
+    [0, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8,
+     8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25],
+    # H
+    [0, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25,
+     25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81],
+    # Q
+    [0, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20,
+     23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68],
+])
+
+
+def calculate_data_module_counts() -> np.ndarray:
+    """
+    Calculates the number of modules available for data and error correcting codes (incl. remainder bits.)
+    That is, all the modules minus function patterns, format info and version info.
+
+    :return: np.ndarray, indexed by version.
+    """
+    version = np.arange(MAX_VERSION + 1)
+    result = (16 * version + 128) * version + 64
+    # Alignment patterns (overlapping the timing patterns are counted once)
+    alignment_count = version // 7 + 2
+    result -= np.where(version >= 2, (25 * alignment_count - 10) * alignment_count - 55, 0)
+    # Version info
+    result -= np.where(version >= 7, 36, 0)
+    result[0] = 0
+    return result
+
+
+data_module_counts = calculate_data_module_counts()
+# Data and error correcting code words altogether. Leftover modules are remainder bits.
+total_code_word_counts = data_module_counts // 8
+# Data code words (without error correcting codes.)
+data_code_word_counts = total_code_word_counts - ecc_words_per_block * rs_block_counts
+
+
+def calculate_alignment_pattern_positions(version: int) -> List[int]:
+    """
+    Calculates the row / column coordinates where alignment patterns are centered.
+    Alignment patterns are placed at every combination of these, except where position markers are.
+    They are evenly spaced from the far end, and the first one is always at 6 (on the timing pattern.)
+
+    :param version: 1 ~ 40
+    :return: List of coordinates in ascending order. Empty for version 1.
+    """
+    if 1 == version:
+        return []
+    count = version // 7 + 2
+    length = 17 + version * 4
+    # Version 32 is the only exception to the formula.
+    step = 26 if 32 == version else (version * 4 + count * 2 + 1) // (count * 2 - 2) * 2
+    return [6] + [length - 7 - i * step for i in reversed(range(count - 1))]
+
+
+# Precomputed alignment pattern coordinates, indexed by version.
+alignment_pattern_positions = [calculate_alignment_pattern_positions(v) for v in range(MAX_VERSION + 1)]
+
+
+def check_version(version: int):
+    if not (MIN_VERSION <= version <= MAX_VERSION):
+        raise ValueError("Version out of range. It should be between {} and {}.".format(MIN_VERSION, MAX_VERSION))
+
+
+def get_data_code_capacity(version: int, error_level: int) -> int:
+    """
+    Gets the number of data code words the symbol can hold.
+
+    :param version: 1 ~ 40
+    :param error_level: FormatInfo.ERROR_*
+    :return: data code word count, excluding error correcting codes.
+    """
+    check_version(version)
+    return int(data_code_word_counts[error_level, version])
+
+
+def get_error_code_word_count(version: int, error_level: int) -> int:
+    """
+    Gets the number of error correcting code words of the whole symbol (all RS blocks.)
+
+    :param version: 1 ~ 40
+    :param error_level: FormatInfo.ERROR_*
+    :return: error correcting code word count
+    """
+    check_version(version)
+    return int(ecc_words_per_block[error_level, version] * rs_block_counts[error_level, version])
+
+
+def get_rs_block_info(version: int, error_level: int) -> List[Tuple[int, int]]:
+    """
+    Gets the RS block structure of the symbol.
+    Blocks are split as evenly as possible; the later blocks hold one more data code word if not divisible.
+
+    :param version: 1 ~ 40
+    :param error_level: FormatInfo.ERROR_*
+    :return: List of Tuple of (RS block data code count, number of that RS blocks,) shorter blocks first.
+    """
+    check_version(version)
+    block_count = int(rs_block_counts[error_level, version])
+    data_code_word_count = int(data_code_word_counts[error_level, version])
+    long_block_count = data_code_word_count % block_count
+    short_block_length = data_code_word_count // block_count
+
+    result = [(short_block_length, block_count - long_block_count)]
+    if 0 != long_block_count:
+        result.append((short_block_length + 1, long_block_count))
+    return result
+
+
+def select_version(bit_length: int, error_level: int, min_version: int = MIN_VERSION,
+                   max_version: int = MAX_VERSION) -> int:
+    """
+    Picks the smallest version which can hold the data.
+    Capacity only grows with version, so this is a binary search over the capacity table.
+
+    :param bit_length: length of the encoded data, in bits. Terminator and padding NOT included.
+    :param error_level: FormatInfo.ERROR_*
+    :param min_version: lower bound of the search, inclusive.
+    :param max_version: upper bound of the search, inclusive.
+    :return: version
+    """
+    check_version(min_version)
+    check_version(max_version)
+    bit_capacities = data_code_word_counts[error_level, min_version:max_version + 1] * 8
+    index = int(np.searchsorted(bit_capacities, bit_length))
+    if index == len(bit_capacities):
+        raise ValueError("Data too long! {} bits cannot fit in version {} or lower.".format(bit_length, max_version))
+    return min_version + index
+
+
+def select_version_by(bit_length_for: Callable[[int], int], error_level: int) -> int:
+    """
+    Picks the smallest version which can hold the data, when its encoded length depends on the version.
+    The length is evaluated once per version class, since it is the same within the class.
+
+    :param bit_length_for: function which takes a version and returns the encoded length in bits.
+    :param error_level: FormatInfo.ERROR_*
+    :return: version
+    """
+    for min_version, max_version in version_classes:
+        bit_length = bit_length_for(max_version)
+        if bit_length <= data_code_word_counts[error_level, max_version] * 8:
+            return select_version(bit_length, error_level, min_version, max_version)
+    raise ValueError("Data too long! It cannot fit in version {} or lower.".format(MAX_VERSION))
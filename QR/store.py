@@ -0,0 +1,233 @@
+"""
+Stores many symbols in a memory-mapped file.
+
+Layout of the file:
+- header: magic, symbol count, and where the symbols start.
+- symbols: bit-packed rows (see QRMatrix.get_packed()), one symbol after another.
+The index, (version, offset, payload hash) of each symbol, is kept in a sidecar file (path + '.idx'),
+so that it can grow without moving the symbols. Its size is the capacity of the index.
+Any symbol can be read at random through the index, without parsing the others.
+"""
+import hashlib
+import os
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from QR import specs
+from QR.value_object import QRModule
+
+MAGIC = b'QRSTORE2'
+
+header_dtype = np.dtype([('magic', 'S8'), ('count', '<u8'), ('data_start', '<u8')])
+# offset is from the start of the symbols. hash is of the payload, see SymbolStore.hash_payload()
+index_dtype = np.dtype([('version', 'u1'), ('offset', '<u8'), ('hash', 'V16')])
+
+
+class SymbolStore:
+    """
+    Memory-mapped file of bit-packed symbols, with its index in a sidecar file.
+    """
+
+    def __init__(self, path: str, writable: bool = False):
+        """
+        Opens an existing store. Use SymbolStore.create() for a new one.
+
+        :param path:
+        :param writable: True to append symbols.
+        """
+        self.path = path
+        self.mode = 'r+' if writable else 'r'
+        self.header = np.memmap(path, dtype=header_dtype, mode=self.mode, shape=(1,))
+        if MAGIC != self.header['magic'][0]:
+            raise ValueError("{} is not a symbol store.".format(path))
+        self.index: Optional[np.memmap] = None
+        self.map_index()
+        self.data: Optional[np.memmap] = None
+        self.map_data()
+
+    @staticmethod
+    def create(path: str, capacity: int) -> 'SymbolStore':
+        """
+        Creates an empty store, overwriting the file if it exists.
+
+        :param path:
+        :param capacity: number of symbols the index is allocated for up front. It grows when it is full.
+        :return: writable SymbolStore
+        """
+        if capacity < 1:
+            raise ValueError("capacity should be 1 or more.")
+        with open(SymbolStore.get_index_path(path), 'wb') as fp:
+            fp.truncate(index_dtype.itemsize * capacity)
+        with open(path, 'wb') as fp:
+            fp.write(np.array([(MAGIC, 0, header_dtype.itemsize)], dtype=header_dtype).tobytes())
+        return SymbolStore(path, writable=True)
+
+    @staticmethod
+    def get_index_path(path: str) -> str:
+        """
+        :param path: path of the store
+        :return: path of the sidecar file which holds the index.
+        """
+        return path + '.idx'
+
+    @staticmethod
+    def hash_payload(payload: Union[str, bytes, memoryview]) -> bytes:
+        """
+        :param payload: str is hashed in UTF-8.
+        :return: 16-byte digest
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    @staticmethod
+    def get_packed_size(version: int) -> int:
+        """
+        :param version:
+        :return: bytes of a bit-packed symbol of the version.
+        """
+        specs.check_version(version)
+        length = 17 + version * 4
+        return length * ((length + 7) // 8)
+
+    def map_data(self):
+        """
+        Maps the symbols region, after the file has grown.
+        """
+        data_start = int(self.header['data_start'][0])
+        data_size = os.path.getsize(self.path) - data_start
+        self.data = None if 0 == data_size else \
+            np.memmap(self.path, dtype=np.uint8, mode=self.mode, offset=data_start, shape=(data_size,))
+
+    def map_index(self):
+        """
+        Maps the index, after it has grown.
+        """
+        index_path = SymbolStore.get_index_path(self.path)
+        capacity = os.path.getsize(index_path) // index_dtype.itemsize
+        self.index = np.memmap(index_path, dtype=index_dtype, mode=self.mode, shape=(capacity,))
+
+    def reserve(self, capacity: int):
+        """
+        Grows the index so that it can hold the number of symbols.
+        Only the sidecar file grows; the symbols and the existing index entries stay where they are.
+
+        :param capacity: number of symbols. Nothing is done if the index is already as large.
+        """
+        if capacity <= len(self.index):
+            return
+        self.index.flush()
+        self.index = None
+        with open(SymbolStore.get_index_path(self.path), 'r+b') as fp:
+            fp.truncate(index_dtype.itemsize * capacity)
+        self.map_index()
+
+    def __len__(self) -> int:
+        return int(self.header['count'][0])
+
+    def append(self, symbols: Union[np.ndarray, Sequence[np.ndarray]],
+               payloads: Sequence[Union[str, bytes, memoryview]]) -> int:
+        """
+        Appends symbols.
+
+        :param symbols: (symbols, n, n) array where ON modules are 1 (e.g. a value of encode_batch(),)
+            or a sequence of (n, n) arrays of any versions (e.g. from stream_encode().)
+        :param payloads: encoded texts of the symbols, in the same order. Only their hashes are stored.
+        :return: index of the first appended symbol.
+        """
+        if len(payloads) != len(symbols):
+            raise ValueError("{} payloads given for {} symbols.".format(len(payloads), len(symbols)))
+        first = len(self)
+        if first + len(symbols) > len(self.index):
+            # Doubled, so that the index is not remapped too often.
+            self.reserve(max(first + len(symbols), len(self.index) * 2))
+        if 0 == len(symbols):
+            return first
+
+        if isinstance(symbols, np.ndarray) and 3 == symbols.ndim:
+            # Same version all along, packed at once.
+            versions = np.full(len(symbols), SymbolStore.get_version_of(symbols[0]))
+            packed = np.packbits(QRModule.on_value == symbols, axis=2).reshape(len(symbols), -1)
+            sizes = np.full(len(symbols), packed.shape[1])
+        else:
+            versions = np.array([SymbolStore.get_version_of(symbol) for symbol in symbols])
+            packed = [np.packbits(QRModule.on_value == np.asarray(symbol), axis=1).ravel() for symbol in symbols]
+            sizes = np.array([len(packed_symbol) for packed_symbol in packed])
+        packed = np.concatenate(packed, axis=None)
+
+        data_start = int(self.header['data_start'][0])
+        offset = os.path.getsize(self.path) - data_start
+
+        # Symbols first, then the index, then the count. The store stays consistent if interrupted,
+        # since nothing beyond the count is read, and nothing below the count is rewritten.
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(data_start + offset + packed.size)
+        self.map_data()
+        self.data[offset:offset + packed.size] = packed
+        entries = self.index[first:first + len(symbols)]
+        entries['version'] = versions
+        entries['offset'] = offset + np.cumsum(sizes) - sizes
+        entries['hash'] = np.frombuffer(b''.join(SymbolStore.hash_payload(payload) for payload in payloads),
+                                        dtype='V16')
+        self.data.flush()
+        self.index.flush()
+        self.header['count'] = first + len(symbols)
+        self.header.flush()
+        return first
+
+    @staticmethod
+    def get_version_of(symbol: np.ndarray) -> int:
+        """
+        :param symbol: (n, n) array
+        :return: version of the symbol, judging from its size.
+        """
+        length = symbol.shape[0]
+        if 2 != symbol.ndim or symbol.shape[1] != length or 0 != (length - 17) % 4:
+            raise ValueError("A symbol should be of shape (n, n) where n = 17 + version * 4, but {} given.".format(
+                symbol.shape))
+        version = (length - 17) // 4
+        specs.check_version(version)
+        return version
+
+    def get_info(self, k: int) -> Tuple[int, int, bytes]:
+        """
+        :param k: index of the symbol.
+        :return: Tuple of (version, offset in the symbols region, payload hash.)
+        """
+        if not (0 <= k < len(self)):
+            raise IndexError("Symbol {} out of range. There are {} symbols.".format(k, len(self)))
+        entry = self.index[k]
+        return int(entry['version']), int(entry['offset']), bytes(entry['hash'])
+
+    def get_packed(self, k: int) -> np.ndarray:
+        """
+        :param k: index of the symbol.
+        :return: (n, ceil(n / 8)) np.ndarray of uint8 on the mapped file, like QRMatrix.get_packed().
+        """
+        version, offset, _ = self.get_info(k)
+        length = 17 + version * 4
+        return self.data[offset:offset + SymbolStore.get_packed_size(version)].reshape(length, -1)
+
+    def get(self, k: int) -> np.ndarray:
+        """
+        :param k: index of the symbol.
+        :return: (n, n) np.ndarray of uint8, 1 for ON and 0 for OFF.
+        """
+        packed = self.get_packed(k)
+        return np.unpackbits(packed, axis=1, count=packed.shape[0])
+
+    def close(self):
+        """
+        Flushes and unmaps the file.
+        """
+        for mapped in (self.data, self.index, self.header):
+            if mapped is not None and 'r' != self.mode:
+                mapped.flush()
+        self.data = self.index = self.header = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class BitWriter:
+    """
+    Bit stream which packs fixed-width fields into bytes as they are appended.
+    Bits are written from the most significant one, which is how QR codes read them.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        # Bits which do not make a whole byte yet, and how many of them there are.
+        self.pending = 0
+        self.pending_bits = 0
+
+    def write(self, value: int, bits: int):
+        """
+        Appends the lower bits of an integer.
+
+        :param value: a non-negative integer. Bits above the width are ignored.
+        :param bits: width of the field
+        """
+        self.pending = (self.pending << bits) | (value & ((1 << bits) - 1))
+        self.pending_bits += bits
+        if self.pending_bits >= 8:
+            byte_count = self.pending_bits // 8
+            self.pending_bits -= byte_count * 8
+            self.buffer += (self.pending >> self.pending_bits).to_bytes(byte_count, 'big')
+            self.pending &= (1 << self.pending_bits) - 1
+
+    def write_array(self, values: np.ndarray, bits: int):
+        """
+        Appends many fields of the same width at once.
+
+        :param values: 1-D array of non-negative integers. Bits above the width are ignored.
+        :param bits: width of each field
+        """
+        if 0 == len(values):
+            return
+        bit_array = (np.asarray(values)[:, np.newaxis] >> np.arange(bits - 1, -1, -1)) & 1
+        packed = np.packbits(bit_array.astype(np.uint8).ravel())
+        self.write(int.from_bytes(packed.tobytes(), 'big') >> (len(packed) * 8 - bit_array.size), bit_array.size)
+
+    def write_bytes(self, data: bytes):
+        """
+        Appends bytes as 8-bit fields.
+
+        :param data: bytes-like object
+        """
+        if 0 == self.pending_bits:
+            self.buffer += data
+            return
+        values = np.frombuffer(data, dtype=np.uint8)
+        if 0 == len(values):
+            return
+        # Off the byte boundary, each output byte is the lower bits of the previous input byte
+        # (the pending bits for the first one) followed by the upper bits of the current one.
+        previous = np.empty_like(values)
+        previous[0] = self.pending
+        previous[1:] = values[:-1]
+        shift = np.uint8(self.pending_bits)
+        self.buffer += ((previous << (np.uint8(8) - shift)) | (values >> shift)).tobytes()
+        self.pending = int(values[-1]) & ((1 << self.pending_bits) - 1)
+
+    def pad_to_byte(self):
+        """
+        Appends 0s until the stream ends at a byte boundary.
+        """
+        if 0 != self.pending_bits:
+            self.write(0, 8 - self.pending_bits)
+
+    def to_bytes(self) -> bytes:
+        """
+        Gets the stream as bytes. The last incomplete byte (if any) is padded with 0s.
+
+        :return: bytes
+        """
+        if 0 == self.pending_bits:
+            return bytes(self.buffer)
+        return bytes(self.buffer) + bytes([self.pending << (8 - self.pending_bits)])
+
+    def __len__(self):
+        """
+        :return: the number of bits written so far.
+        """
+        return len(self.buffer) * 8 + self.pending_bits
@@ -1,47 +1,93 @@
 import csv
+import sys
+from itertools import islice
 
-from QR.objects import QRMatrix, TimingPattern, PositionMarker, MiniPositionMarker, FormatInfo, place_data, \
-    create_8bit_data_code, create_alphanumeric_data_code
+from QR import specs
+from QR.batch import stream_encode
+from QR.numpy import as_chars
+from QR.render import to_png, to_svg, to_terminal
+from QR.store import SymbolStore
+from QR.modes import get_segments_bit_length, split_segments
+from QR.objects import FunctionPatternTemplate, FormatInfo, place_data, create_8bit_data_code, \
+    create_alphanumeric_data_code, create_segmented_data_code
 
-if __name__ == '__main__':
-    qr_matrix = QRMatrix(version=2)
-    timing = TimingPattern(version=2)
-    qr_matrix.overwrite_with(timing)
 
-    qr_matrix.place(PositionMarker.create_marker_at(PositionMarker.UPPER_LEFT), 0, 0)
-    qr_matrix.place(PositionMarker.create_marker_at(PositionMarker.UPPER_RIGHT), 0, -8)
-    qr_matrix.place(PositionMarker.create_marker_at(PositionMarker.LOWER_LEFT), -8, 0)
+def encode_file(input_path: str, output_path: str, error_level: int):
+    """
+    Encodes each line of the input file, appending the symbols to a CSV one by one (separated by an empty row.)
+    Lines are read as they are needed, so the file can be arbitrarily long.
+    """
+    if output_path.endswith('.qrs'):
+        encode_file_to_store(input_path, output_path, error_level)
+        return
 
-    qr_matrix.place(MiniPositionMarker.create(), -9, -9)
+    with open(input_path, newline='') as input_fp, open(output_path, 'w', newline='') as output_fp:
+        writer = csv.writer(output_fp)
+        for symbol in stream_encode((line.rstrip('\r\n') for line in input_fp), error_level):
+            writer.writerows(as_chars(symbol))
+            writer.writerow([])
 
-    mask_id = 7
-    format_info = FormatInfo(version=2, error_level=FormatInfo.ERROR_LOW, mask_pattern=mask_id)
 
-    qr_matrix.merge(format_info)
+def encode_file_to_store(input_path: str, output_path: str, error_level: int, chunk_size: int = 1024):
+    """
+    Encodes each line of the input file into a SymbolStore, where symbol k is line k.
+    Lines are read as they are needed, and the store grows as it fills up.
+    """
+    with open(input_path, newline='') as input_fp, SymbolStore.create(output_path, chunk_size) as store:
+        lines = (line.rstrip('\r\n') for line in input_fp)
+        for chunk in iter(lambda: list(islice(lines, chunk_size)), []):
+            store.append(list(stream_encode(chunk, error_level, chunk_size=chunk_size)), chunk)
+
+
+if __name__ == '__main__':
+    error_level = FormatInfo.ERROR_LOW
+
+    # main.py <payload file> [output csv]: one symbol per line of the file.
+    if len(sys.argv) > 1:
+        encode_file(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else 'output.csv', error_level)
+        sys.exit()
 
     raw_text = "http://srv.prof-morii.net/~lab"
 
-    encoded_text = create_8bit_data_code(raw_text=raw_text, data_code_capacity=34)
+    # Modes are switched in the middle of the text, wherever it makes the data shorter.
+    version = specs.select_version_by(lambda v: get_segments_bit_length(split_segments(raw_text, v), v),
+                                      error_level)
+    qr_matrix = FunctionPatternTemplate.create_base(version=version)
 
+    encoded_text = create_segmented_data_code(raw_text=raw_text,
+                                              data_code_capacity=specs.get_data_code_capacity(version, error_level),
+                                              version=version)
+
+    #encoded_text = create_8bit_data_code(raw_text=raw_text, data_code_capacity=34)
     #encoded_text = create_alphanumeric_data_code(raw_text=raw_text, text_capacity=47, data_code_capacity=34)
 
     data_matrix = place_data(base=qr_matrix, raw_data_code=encoded_text,
-                             rs_block_info=[(34, 1)], error_code_word_count=10,
-                             mask_id=mask_id)
+                             rs_block_info=specs.get_rs_block_info(version, error_level),
+                             error_code_word_count=specs.get_error_code_word_count(version, error_level),
+                             mask_id='auto', error_level=error_level)
+
+    # Format info depends on the mask selected above.
+    format_info = FormatInfo(version=version, error_level=error_level, mask_pattern=data_matrix.mask_id)
+    qr_matrix.merge(format_info)
 
     with open('output-base.csv', 'w') as fp:
         writer = csv.writer(fp)
-        for i in range(qr_matrix.length):
-            writer.writerow(map(lambda m: m.get_as_char(), qr_matrix.value[i, :]))
+        writer.writerows(qr_matrix.get_as_char())
 
     with open('output-data.csv', 'w') as fp:
         writer = csv.writer(fp)
-        for i in range(qr_matrix.length):
-            writer.writerow(map(lambda m: m.get_as_char(), data_matrix.value[i, :]))
+        writer.writerows(data_matrix.get_as_char())
 
     qr_matrix.merge(data_matrix)
 
     with open('output.csv', 'w') as fp:
         writer = csv.writer(fp)
-        for i in range(qr_matrix.length):
-            writer.writerow(map(lambda m: m.get_as_char(), qr_matrix.value[i, :]))
+        writer.writerows(qr_matrix.get_as_char())
+
+    with open('output.png', 'wb') as fp:
+        fp.write(to_png(qr_matrix, scale=8))
+
+    with open('output.svg', 'w') as fp:
+        fp.write(to_svg(qr_matrix, scale=8))
+
+    print(to_terminal(qr_matrix))